@@ -0,0 +1,195 @@
+import os
+# draw without a window, this must be set before pygame starts
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+import stdlib
+import scanner
+import snapshot
+import display_unit
+import layout
+import hashlib
+import multiprocessing
+import optparse
+import os.path
+import pygame
+import sys
+import time
+# run with: python batch.py [options] folder [folder ...]
+
+
+class Canvas(object):
+
+    def __init__(self, size, background_color = stdlib.STANDARD_GRAY):
+        '''(Canvas, stdlib.Point[, tuple]) -> NoneType
+
+        Construct a surface in memory the map can be drawn on, taking the
+        place of the form
+
+        self : the canvas
+        size : the size of the image
+        background_color : the color where there is no file
+        '''
+
+        self.size = size
+        self.current_color = background_color
+        self.screen = pygame.Surface((size.x, size.y))
+        self.screen.fill(background_color)
+
+    def calculate_real_position(self):
+        '''(Canvas) -> stdlib.Point
+
+        Return the position of the canvas, the map is drawn from the corner
+
+        self : the canvas
+        '''
+
+        return stdlib.Point(0, 0)
+
+
+def image_name(path):
+    '''(string) -> string
+
+    Return the name of the image of the folder at path, the name of the
+    folder followed by a hash of its path so 2 folders of the same name do
+    not write the same image
+
+    path : the path of the folder
+    '''
+
+    path = os.path.abspath(path)
+    name = os.path.basename(path.rstrip(os.sep)) or "root"
+    if isinstance(path, unicode):
+        path = path.encode("utf-8")
+    return "%s-%s.png" % (name, hashlib.md5(path).hexdigest()[:8])
+
+
+def render(path, size, layout_name = None, use_snapshot = False, \
+           folder_scanner = None):
+    '''(string, stdlib.Point[, string, boolean, scanner.Scanner])
+                                                            -> pygame.Surface
+
+    Return the image of the map of the folder at path
+
+    path : the path of the folder
+    size : the size of the image
+    layout_name : the name of the layout, stdlib.LAYOUT if None
+    use_snapshot : True to read only what has changed since the last
+                   snapshot of the folder, and save it again, a file
+                   which only changed its size is then drawn at its old
+                   size
+    folder_scanner : the scanner reading the folder, a new one if None
+    '''
+
+    if folder_scanner is None:
+        folder_scanner = scanner.Scanner()
+    # the same path as the form gives, so they share the snapshot
+    path = os.path.abspath(path)
+    if use_snapshot:
+        root = snapshot.open_tree(path, folder_scanner)
+    else:
+        root = folder_scanner.scan(path)
+    canvas = Canvas(size)
+    unit = display_unit.DisplayUnit(stdlib.Point(0, 0), size, canvas, \
+                                    [root], \
+                                    file_layout = \
+                                    layout.get_layout(layout_name))
+    unit.draw()
+    return canvas.screen
+
+
+def render_file(task):
+    '''(tuple) -> tuple
+
+    Write the image of a folder, this is run by the worker processes
+    Return (path, image file, seconds, system calls made to read the
+    folder, error message or None)
+
+    task : (path, output folder, size, layout name, use snapshot)
+    '''
+
+    path, output, size, layout_name, use_snapshot = task
+    filename = os.path.join(output, image_name(path))
+    start = time.time()
+    if not os.path.isdir(path):
+        return path, filename, 0, 0, "not a folder"
+    folder_scanner = scanner.Scanner()
+    try:
+        surface = render(path, size, layout_name, use_snapshot, \
+                         folder_scanner)
+        pygame.image.save(surface, filename)
+    except (IOError, OSError, pygame.error), e:
+        return path, filename, time.time() - start, \
+               folder_scanner.syscall_count(), str(e)
+    return path, filename, time.time() - start, \
+           folder_scanner.syscall_count(), None
+
+
+def main(arguments):
+    '''(list) -> int
+
+    Write the image of every folder given on the command line
+    Return 0 if every image was written, 1 otherwise
+
+    arguments : the command line, without the name of the program
+    '''
+
+    parser = optparse.OptionParser( \
+        usage = "python batch.py [options] folder [folder ...]")
+    parser.add_option("-o", "--output", default = ".", \
+                      help = "folder of the images [%default]")
+    parser.add_option("-s", "--size", default = "1024x768", \
+                      help = "size of the images [%default]")
+    parser.add_option("-j", "--jobs", type = "int", \
+                      default = multiprocessing.cpu_count(), \
+                      help = "folders drawn at the same time [%default]")
+    parser.add_option("-l", "--layout", choices = sorted(layout.LAYOUTS), \
+                      help = "how the map is cut, one of " + \
+                             ", ".join(sorted(layout.LAYOUTS)))
+    parser.add_option("--snapshot", action = "store_true", \
+                      default = False, \
+                      help = "read only the directories changed since the " \
+                             "last snapshot, files changed in place keep " \
+                             "their old size")
+    options, paths = parser.parse_args(arguments)
+    if not paths:
+        parser.error("no folder given")
+    try:
+        size = stdlib.parse_size(options.size)
+    except ValueError:
+        parser.error("the size must be WIDTHxHEIGHT: " + options.size)
+    if not os.path.isdir(options.output):
+        os.makedirs(options.output)
+    # a folder given twice would be drawn twice into the same image
+    folders = []
+    seen = set()
+    for path in paths:
+        if os.path.abspath(path) not in seen:
+            seen.add(os.path.abspath(path))
+            folders.append(path)
+    tasks = [(path, options.output, size, options.layout, \
+              options.snapshot) for path in folders]
+    if options.jobs > 1 and len(tasks) > 1:
+        pool = multiprocessing.Pool(min(options.jobs, len(tasks)))
+        results = pool.imap_unordered(render_file, tasks)
+    else:
+        pool = None
+        results = (render_file(task) for task in tasks)
+    failed = 0
+    try:
+        for path, filename, seconds, syscalls, error in results:
+            if error:
+                failed += 1
+                print "%s: failed: %s" % (path, error)
+            else:
+                print "%s: %s (%.1f s, %d system calls)" % \
+                      (path, filename, seconds, syscalls)
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+    if failed:
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,519 @@
+import stdlib
+import systemIO
+import scanner
+import display_unit
+import layout
+import compact_tree
+import unit_index
+import win_form
+import json
+import multiprocessing
+import optparse
+import os
+import os.path
+import platform
+import pygame
+import random
+import shutil
+import sys
+import tempfile
+import time
+try:
+    import vector_layout
+except ImportError:
+    # numpy is not installed
+    vector_layout = None
+try:
+    import resource
+except ImportError:
+    # not on windows
+    resource = None
+# run with: python benchmark.py [largest number of files]
+#       or: python benchmark.py --suite [-o results.json] [-b baseline.json]
+
+# the trees of the suite: name, sub-directories in every directory, levels
+# of sub-directories and files in every directory, about 20000 files each
+SUITE = [("flat", 0, 0, 20000), \
+         ("wide", 50, 2, 8), \
+         ("deep", 2, 10, 10)]
+# what is compared with the baseline, all of them are better when lower
+MEASURES = ["scan", "scanner", "layout", "draw", "index", "mouse_tree", \
+            "mouse_index", "peak_memory", "syscalls"]
+# the map of the suite, as on the main form
+MAP_POSITION = stdlib.Point(10, 10)
+MAP_SIZE = stdlib.Point(1004, 510)
+
+
+class Canvas(win_form.WinForm):
+
+    def __init__(self, size):
+        '''(Canvas, stdlib.Point) -> NoneType
+
+        Construct a form drawing in memory instead of on a window, so the
+        map can be drawn and hovered without a display
+
+        self : the canvas
+        size : the size of the form
+        '''
+
+        win_form.WinForm.__init__(self, size)
+        self.screen = pygame.Surface((size.x, size.y))
+        self.cache = pygame.Surface((size.x, size.y))
+        self.screen.fill(self.current_color)
+
+
+def random_size(distribution):
+    '''(string) -> int
+
+    Return the size of a made up file
+    The sizes are "uniform" (random between 1 and 1000000) or "skewed"
+    (pareto, a few huge files and a lot of small ones)
+
+    distribution : "uniform" or "skewed"
+    '''
+
+    if distribution == "uniform":
+        return random.randint(1, 1000000)
+    return int(random.paretovariate(1.0) * 1000)
+
+
+def make_directory(count, distribution):
+    '''(int, string) -> systemIO.DirectoryInfo
+
+    Return a directory living only in memory, with count files
+    The sizes are "uniform" (random between 1 and 1000000) or "skewed"
+    (pareto, a few huge files and a lot of small ones)
+
+    count : the number of files
+    distribution : "uniform" or "skewed"
+    '''
+
+    directory = systemIO.DirectoryInfo("bench", None, False)
+    for i in range(0, count):
+        directory.children.append(systemIO.FileSystemInfo( \
+            "bench/" + str(i), directory, stdlib.FILE, \
+            random_size(distribution)))
+    directory.update()
+    return directory
+
+
+def make_tree(fanout, depth, files, distribution, path = "bench", \
+              on_disk = False):
+    '''(int, int, int, string[, string, boolean]) -> tuple
+
+    Return (top directory, number of directories) of a made up tree: every
+    directory has files files and fanout sub-directories, down to depth
+    levels under the top
+    If on_disk, the tree is also written at path, the files are sparse so
+    they take no room but have their size
+
+    fanout : the number of sub-directories of every directory
+    depth : the number of levels of sub-directories
+    files : the number of files of every directory
+    distribution : "uniform" or "skewed", see random_size
+    path : the path of the top directory
+    on_disk : True to write the tree
+    '''
+
+    root = systemIO.DirectoryInfo(path, None, False)
+    directories = []
+    stack = [(root, 0)]
+    while stack:
+        directory, level = stack.pop()
+        directories.append(directory)
+        if on_disk:
+            os.mkdir(directory.path)
+        for i in range(0, files):
+            size = random_size(distribution)
+            file_path = os.path.join(directory.path, "f" + str(i))
+            if on_disk:
+                new_file = open(file_path, "wb")
+                new_file.truncate(size)
+                new_file.close()
+            directory.children.append(systemIO.FileSystemInfo( \
+                file_path, directory, stdlib.FILE, size))
+        if level < depth:
+            for i in range(0, fanout):
+                child = systemIO.DirectoryInfo( \
+                    os.path.join(directory.path, "d" + str(i)), \
+                    directory, False)
+                directory.children.append(child)
+                stack.append((child, level + 1))
+    # a directory comes before all the ones under it
+    for directory in reversed(directories):
+        directory.update()
+    return root, len(directories)
+
+
+def time_layout(directory, file_layout = None):
+    '''(systemIO.DirectoryInfo[, object]) -> float, display_unit.DisplayUnit
+
+    Return the seconds taken to lay out the directory on a map of the size
+    of the main form, and the top unit of the map
+
+    directory : the directory
+    file_layout : the layout, the one of stdlib.LAYOUT if None
+    '''
+
+    start = time.time()
+    unit = display_unit.DisplayUnit(stdlib.Point(10, 10), \
+                                    stdlib.Point(1004, 510), \
+                                    None, [directory], \
+                                    file_layout = file_layout)
+    return time.time() - start, unit
+
+
+def time_vector_layout(directory):
+    '''(systemIO.DirectoryInfo) -> float
+
+    Return the seconds taken to lay out the directory into an array with
+    vector_layout, on a map of the size of the main form
+
+    directory : the directory
+    '''
+
+    tree = compact_tree.from_directory(directory)
+    start = time.time()
+    vector_layout.layout(tree, stdlib.Point(10, 10), stdlib.Point(1004, 510))
+    return time.time() - start
+
+
+def layout_scaling(largest):
+    '''(int) -> NoneType
+
+    Print the time to lay out one directory of 1000 files, 10 times more,
+    and so on up to largest files
+    With a linear layout the time for each file stays the same
+
+    largest : the largest number of files
+    '''
+
+    for distribution in ["uniform", "skewed"]:
+        count = 1000
+        while count <= largest:
+            directory = make_directory(count, distribution)
+            seconds = time_layout(directory)[0]
+            print "layout %-8s %8d files %8.3f s %6.2f us/file" % \
+                  (distribution, count, seconds, seconds * 1e6 / count)
+            if vector_layout:
+                seconds = time_vector_layout(directory)
+                print "vector %-8s %8d files %8.3f s %6.2f us/file" % \
+                      (distribution, count, seconds, seconds * 1e6 / count)
+            count *= 10
+
+
+def compare_layouts(count):
+    '''(int) -> NoneType
+
+    Print the time taken by every layout on directories of count files,
+    and how easy the map is to read: the ratio of the longer side over the
+    shorter side of the files and the number of slivers and hidden files
+
+    count : the number of files
+    '''
+
+    for distribution in ["uniform", "skewed"]:
+        directory = make_directory(count, distribution)
+        for name in sorted(layout.LAYOUTS):
+            seconds, unit = time_layout(directory, layout.LAYOUTS[name])
+            stats = layout.statistics(unit)
+            print "%-10s %-8s %8.3f s ratio mean %7.2f median %6.2f " \
+                  "worst %9.1f slivers %6d hidden %6d" % \
+                  (name, distribution, seconds, stats["mean"], \
+                   stats["median"], stats["worst"], stats["slivers"], \
+                   stats["hidden"])
+
+
+def count_units(unit):
+    '''(display_unit.DisplayUnit) -> int
+
+    Return the number of display units of the map
+
+    unit : the top unit of the map
+    '''
+
+    count = 0
+    stack = [unit]
+    while stack:
+        unit = stack.pop()
+        count += 1
+        if unit.left:
+            stack.append(unit.left)
+        if unit.right:
+            stack.append(unit.right)
+    return count
+
+
+def peak_memory():
+    '''() -> int
+
+    Return the most memory the process has used so far in kilobytes, None
+    if it is not known
+    '''
+
+    if not resource:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        # in bytes there
+        peak /= 1024
+    return peak
+
+
+def time_events(unit, events):
+    '''(display_unit.DisplayUnit, list) -> float
+
+    Return the seconds taken by the map to handle every event, on average
+
+    unit : the top unit of the map
+    events : the mouse events
+    '''
+
+    form = unit.parent
+    start = time.time()
+    for event in events:
+        unit.mouse_event(event)
+    seconds = (time.time() - start) / len(events)
+    form.dirty = []
+    return seconds
+
+
+def run_case(case):
+    '''(tuple) -> dict
+
+    Build one tree of the suite and return what was measured on it: the
+    seconds to read it from the disk (DirectoryInfo and the scanner), to
+    lay out, draw and index the map, and for one mouse move with and without
+    the index, and the peak memory in kilobytes
+    The system calls made by the scanner are counted too, in total and of
+    every kind, with the way it really read the directories
+    This is run in a process of its own so the peak memory is its own
+
+    case : (name, fanout, depth, files, distribution, folder on the disk or
+           None to keep the tree in memory, number of mouse moves, seed)
+    '''
+
+    name, fanout, depth, files, distribution, disk, moves, seed = case
+    random.seed(seed)
+    result = {"name": name, "fanout": fanout, "depth": depth, \
+              "files": files, "distribution": distribution}
+    if disk:
+        folder = tempfile.mkdtemp(prefix = "treemap-bench-", dir = disk)
+        try:
+            path = os.path.join(folder, "bench")
+            root, directories = make_tree(fanout, depth, files, \
+                                          distribution, path, True)
+            start = time.time()
+            systemIO.DirectoryInfo(path)
+            result["scan"] = time.time() - start
+            start = time.time()
+            folder_scanner = scanner.Scanner(lazy_depth = None)
+            folder_scanner.scan(path)
+            result["scanner"] = time.time() - start
+            result["syscalls"] = folder_scanner.syscall_count()
+            result["syscall_kinds"] = folder_scanner.syscalls
+            # scandir falls back to listdir when it is not installed
+            result["scan_mode"] = ["listdir", "scandir"] \
+                                  [folder_scanner.read_mode()]
+        finally:
+            shutil.rmtree(folder)
+    else:
+        root, directories = make_tree(fanout, depth, files, distribution)
+    result["directories"] = directories
+    result["file_count"] = directories * files
+    canvas = Canvas(stdlib.Point(MAP_POSITION.x * 2 + MAP_SIZE.x, \
+                                 MAP_POSITION.y * 2 + MAP_SIZE.y))
+    seconds, unit = time_layout(root)
+    unit.parent = canvas
+    result["layout"] = seconds
+    result["units"] = count_units(unit)
+    start = time.time()
+    unit.draw()
+    result["draw"] = time.time() - start
+    canvas.keep()
+    events = [pygame.event.Event(pygame.MOUSEMOTION, \
+              pos = (MAP_POSITION.x + random.randrange(MAP_SIZE.x), \
+                     MAP_POSITION.y + random.randrange(MAP_SIZE.y))) \
+              for i in range(0, moves)]
+    result["mouse_tree"] = time_events(unit, events)
+    start = time.time()
+    unit.index = unit_index.UnitIndex(unit.position, unit.size)
+    unit.index.replace(unit)
+    result["index"] = time.time() - start
+    result["mouse_index"] = time_events(unit, events)
+    result["peak_memory"] = peak_memory()
+    return result
+
+
+def run_suite(cases, distribution = "skewed", disk = None, moves = 1000, \
+              repeat = 1, seed = 1):
+    '''(list[, string, string, int, int, int]) -> dict
+
+    Run every case and return the results, ready to be written as JSON
+    Every time is the best of repeat runs
+
+    cases : (name, fanout, depth, files) of every tree, see SUITE
+    distribution : "uniform" or "skewed", see random_size
+    disk : the folder the trees are written in to time reading them, best
+           on a tmpfs such as /dev/shm, None to keep them in memory only
+    moves : the number of mouse moves timed
+    repeat : the number of runs of every case
+    seed : the seed of the random numbers, the same seed makes the same
+           trees
+    '''
+
+    results = []
+    for name, fanout, depth, files in cases:
+        best = None
+        for i in range(0, repeat):
+            # a new process every time, so the memory of a case is its own
+            pool = multiprocessing.Pool(1)
+            try:
+                result = pool.apply(run_case, \
+                                    [(name, fanout, depth, files, \
+                                      distribution, disk, moves, seed)])
+            finally:
+                pool.close()
+                pool.join()
+            if best is None:
+                best = result
+            for measure in MEASURES:
+                if measure in result and result[measure] is not None:
+                    best[measure] = min(best[measure], result[measure])
+        results.append(best)
+        print "%-8s %7d files %6d units layout %7.3f s draw %7.3f s " \
+              "mouse %8.1f us indexed %6.1f us" % \
+              (name, best["file_count"], best["units"], best["layout"], \
+               best["draw"], best["mouse_tree"] * 1e6, \
+               best["mouse_index"] * 1e6)
+    return {"version": 1, \
+            "time": time.time(), \
+            "python": platform.python_version(), \
+            "platform": platform.platform(), \
+            "layout": stdlib.LAYOUT, \
+            "distribution": distribution, \
+            "disk": disk, \
+            "moves": moves, \
+            "repeat": repeat, \
+            "seed": seed, \
+            "cases": results}
+
+
+def compare(results, baseline, tolerance):
+    '''(dict, dict, float) -> list
+
+    Return a message for every measure of results worse than in the
+    baseline by more than tolerance, 0.2 being 20 %
+    Cases or measures missing from one of them are left out
+
+    results : the results of run_suite
+    baseline : older results of run_suite
+    tolerance : how much worse a measure can be
+    '''
+
+    old_cases = {}
+    for case in baseline["cases"]:
+        old_cases[case["name"]] = case
+    messages = []
+    for case in results["cases"]:
+        old = old_cases.get(case["name"])
+        if not old:
+            continue
+        for measure in MEASURES:
+            if case.get(measure) is None or not old.get(measure):
+                continue
+            if case[measure] > old[measure] * (1 + tolerance):
+                messages.append("%s %s: %g, was %g (+%.0f %%)" % \
+                                (case["name"], measure, case[measure], \
+                                 old[measure], \
+                                 (case[measure] / float(old[measure]) - 1) \
+                                 * 100))
+    return messages
+
+
+def main(arguments):
+    '''(list) -> int
+
+    Run the benchmark asked on the command line
+    Return 1 if the suite is slower than the baseline, 0 otherwise
+
+    arguments : the command line, without the name of the program
+    '''
+
+    parser = optparse.OptionParser( \
+        usage = "python benchmark.py [options] [largest number of files]")
+    parser.add_option("--suite", action = "store_true", default = False, \
+                      help = "time scan, layout, draw and mouse on made up " \
+                             "trees and write the results as JSON")
+    parser.add_option("-o", "--output", default = "benchmark.json", \
+                      help = "file of the results of the suite [%default]")
+    parser.add_option("-b", "--baseline", \
+                      help = "results of an older suite to compare with")
+    parser.add_option("-t", "--tolerance", type = "float", default = 0.2, \
+                      help = "how much slower than the baseline is a " \
+                             "regression [%default]")
+    disk = None
+    if os.path.isdir("/dev/shm"):
+        disk = "/dev/shm"
+    parser.add_option("-d", "--disk", default = disk, \
+                      help = "folder the trees are written in to time the " \
+                             "scan, a tmpfs is best [%default]")
+    parser.add_option("--in-memory", action = "store_const", const = None, \
+                      dest = "disk", \
+                      help = "keep the trees in memory, do not time the scan")
+    parser.add_option("--fanout", type = "int", \
+                      help = "run one tree with this many sub-directories " \
+                             "in every directory instead of the suite")
+    parser.add_option("--depth", type = "int", default = 3, \
+                      help = "levels of sub-directories of that tree " \
+                             "[%default]")
+    parser.add_option("--files", type = "int", default = 20, \
+                      help = "files in every directory of that tree " \
+                             "[%default]")
+    parser.add_option("--distribution", choices = ["uniform", "skewed"], \
+                      default = "skewed", \
+                      help = "sizes of the files, uniform or skewed " \
+                             "[%default]")
+    parser.add_option("-m", "--moves", type = "int", default = 1000, \
+                      help = "mouse moves timed [%default]")
+    parser.add_option("-r", "--repeat", type = "int", default = 3, \
+                      help = "runs of every tree, the best is kept " \
+                             "[%default]")
+    parser.add_option("--seed", type = "int", default = 1, \
+                      help = "seed of the made up trees [%default]")
+    options, rest = parser.parse_args(arguments)
+    if not options.suite:
+        largest = 1000000
+        if rest:
+            largest = int(rest[0])
+        layout_scaling(largest)
+        compare_layouts(min(largest, 10000))
+        return 0
+    cases = SUITE
+    if options.fanout is not None:
+        cases = [("custom", options.fanout, options.depth, options.files)]
+    results = run_suite(cases, options.distribution, options.disk, \
+                        options.moves, options.repeat, options.seed)
+    output = open(options.output, "w")
+    try:
+        json.dump(results, output, indent = 2, sort_keys = True)
+    finally:
+        output.close()
+    print "written to", options.output
+    if not options.baseline:
+        return 0
+    baseline_file = open(options.baseline)
+    try:
+        baseline = json.load(baseline_file)
+    finally:
+        baseline_file.close()
+    messages = compare(results, baseline, options.tolerance)
+    for message in messages:
+        print "slower:", message
+    if messages:
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
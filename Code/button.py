@@ -1,6 +1,7 @@
 import control
 import stdlib
 import label
+import instrument
 import pygame
 
 
@@ -61,8 +62,8 @@ class Button(control.Control):
         '''
 
         # setup font
-        self.label.font = pygame.font.Font(None, 20)
-        text_size = self.label.font.size(self.label.text)
+        self.label.font = control.get_font()
+        text_size = control.render_text(self.label.text).get_size()
         self.label.size = stdlib.Point(text_size[0], text_size[1])
         # calculate the position of the label
         # make the text be the center of the button
@@ -70,6 +71,7 @@ class Button(control.Control):
         y = (self.size.y - self.label.size.y) / 2
         self.label.position = stdlib.Point(x, y)
 
+    @instrument.timed("draws")
     def _draw(self):
         '''(Button) -> NoneType
 
@@ -133,6 +135,7 @@ class Button(control.Control):
 
         self.condition = stdlib.HOVER
         self.draw()
+        self.invalidate()
         return [self.mouse_hover, []]
 
     def local_act_mouse_down(self, event):
@@ -147,6 +150,7 @@ class Button(control.Control):
 
         self.condition = stdlib.CLICK
         self.draw()
+        self.invalidate()
         return [self.mouse_down, []]
 
     def local_act_mouse_up(self, event):
@@ -165,6 +169,7 @@ class Button(control.Control):
             self.condition = stdlib.NORMAL
             # redraw it
             self.draw()
+            self.invalidate()
             # and annouce click event
             return [self.mouse_click, []]
         # otherwise do nothing
@@ -187,6 +192,7 @@ class Button(control.Control):
             self.condition = stdlib.NORMAL
             # and redraw it
             self.draw()
+            self.invalidate()
         return [self.no_focus, []]
 
     def mouse_event(self, event):
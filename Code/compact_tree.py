@@ -0,0 +1,443 @@
+import stdlib
+import array
+import os.path
+
+
+class CompactTree(object):
+
+    def __init__(self, path):
+        '''(CompactTree, string) -> NoneType
+
+        Construct a tree holding only its top directory
+        Every file or directory is a number, its information is kept in
+        arrays instead of one object for each of them
+        The children of a directory are in a row of self.order, from
+        self.first to self.first + self.count, smallest first
+
+        self : the tree
+        path : the path of the top directory
+        '''
+
+        # the path of the top directory, the others only keep their name
+        self.path = path
+        self.parent = array.array("i")
+        # first slot of the children in self.order, -1 for files
+        self.first = array.array("i")
+        self.count = array.array("i")
+        self.size = array.array("d")
+        self.typ = array.array("b")
+        self.name = array.array("i")
+        # slot -> node, and node -> slot in the children of its parent
+        self.order = array.array("i")
+        self.slot = array.array("i")
+        # every name is kept only once
+        self.names = []
+        self._name_index = {}
+        # device and inode -> nodes of the links of files with several hard
+        # links, only used while adding
+        self._links = {}
+        # node -> display unit, only for the nodes on the map
+        self.display_units = {}
+        self._add(-1, path, stdlib.DIRECTORY, 0)
+
+    def _add(self, parent, name, typ, size):
+        '''(CompactTree, int, string, int, int) -> int
+
+        Add a file or directory and return its number
+        Its slot is set when the children of its parent are put in order
+
+        self : the tree
+        parent : the number of the parent, -1 for the top
+        name : the name of the file
+        typ : stdlib.FILE or stdlib.DIRECTORY
+        size : the size of the file
+        '''
+
+        index = self._name_index.get(name)
+        if index is None:
+            index = len(self.names)
+            self.names.append(name)
+            self._name_index[name] = index
+        self.parent.append(parent)
+        self.first.append(-1)
+        self.count.append(0)
+        self.size.append(size)
+        self.typ.append(typ)
+        self.name.append(index)
+        self.slot.append(-1)
+        return len(self.parent) - 1
+
+    def add_children(self, node, entries):
+        '''(CompactTree, int, list) -> list
+
+        Add every entry as a child of the directory
+        Return the list of (path, number) of the new sub-directories
+
+        self : the tree
+        node : the number of the directory
+        entries : list of (path, is directory, size, link)
+        '''
+
+        self.first[node] = len(self.order)
+        self.count[node] = len(entries)
+        sub_directories = []
+        for entry_path, is_directory, size, link in entries:
+            typ = stdlib.FILE
+            if is_directory:
+                typ = stdlib.DIRECTORY
+            child = self._add(node, os.path.basename(entry_path), typ, size)
+            self.order.append(child)
+            if is_directory:
+                sub_directories.append((entry_path, child))
+            elif link is not None:
+                self._links.setdefault(link, []).append(child)
+        return sub_directories
+
+    def finish(self):
+        '''(CompactTree) -> NoneType
+
+        Compute the size of every directory and put all the children in
+        order, once every directory has been added
+
+        self : the tree
+        '''
+
+        # children always have a bigger number than their parent
+        size = self.size
+        parent = self.parent
+        # a file with several hard links is counted at its link of smallest
+        # path only, as in systemIO.HardLinks
+        for nodes in self._links.values():
+            counted = min(nodes, key = self.path_of)
+            for node in nodes:
+                if node != counted:
+                    size[node] = 0
+        self._links = {}
+        for node in range(len(parent) - 1, 0, -1):
+            size[parent[node]] += size[node]
+        # only used while adding
+        self._name_index = {}
+        for node in range(0, len(parent)):
+            if self.typ[node] != stdlib.DIRECTORY or not self.count[node]:
+                continue
+            start = self.first[node]
+            end = start + self.count[node]
+            self.order[start:end] = array.array("i", \
+                    sorted(self.order[start:end], key = size.__getitem__))
+            for slot in range(start, end):
+                self.slot[self.order[slot]] = slot
+
+    def path_of(self, node):
+        '''(CompactTree, int) -> string
+
+        Return the full path of the file
+
+        self : the tree
+        node : the number of the file
+        '''
+
+        names = []
+        while node > 0:
+            names.append(self.names[self.name[node]])
+            node = self.parent[node]
+        names.append(self.path)
+        names.reverse()
+        return os.path.join(*names)
+
+    def node(self, index):
+        '''(CompactTree, int) -> CompactNode
+
+        Return a view of the file having the same attributes as a
+        systemIO.FileSystemInfo, or None if index is -1
+
+        self : the tree
+        index : the number of the file
+        '''
+
+        if index < 0:
+            return None
+        return CompactNode(self, index)
+
+    def root(self):
+        '''(CompactTree) -> CompactNode
+
+        Return the view of the top directory
+
+        self : the tree
+        '''
+
+        return CompactNode(self, 0)
+
+    def __len__(self):
+        '''(CompactTree) -> int
+
+        Return the number of files and directories
+
+        self : the tree
+        '''
+
+        return len(self.parent)
+
+
+class CompactNode(object):
+    # a view is only two references, it is made when needed
+    __slots__ = ("tree", "index")
+
+    def __init__(self, tree, index):
+        '''(CompactNode, CompactTree, int) -> NoneType
+
+        Construct a view of a file of the tree
+
+        self : the view
+        tree : the tree
+        index : the number of the file
+        '''
+
+        self.tree = tree
+        self.index = index
+
+    def __eq__(self, other):
+        '''(CompactNode, object) -> boolean
+
+        Return True if both are views of the same file
+
+        self : the view
+        other : the other view
+        '''
+
+        return isinstance(other, CompactNode) and \
+               self.tree is other.tree and self.index == other.index
+
+    def __ne__(self, other):
+        '''(CompactNode, object) -> boolean
+
+        Return True if they are not views of the same file
+
+        self : the view
+        other : the other view
+        '''
+
+        return not self == other
+
+    def __hash__(self):
+        '''(CompactNode) -> int
+
+        Return the hash of the file
+
+        self : the view
+        '''
+
+        return hash((id(self.tree), self.index))
+
+    @property
+    def path(self):
+        '''(CompactNode) -> string
+
+        Return the full path of the file, made from the names
+
+        self : the view
+        '''
+
+        return self.tree.path_of(self.index)
+
+    @property
+    def size(self):
+        '''(CompactNode) -> int
+
+        Return the size of the file
+
+        self : the view
+        '''
+
+        return int(self.tree.size[self.index])
+
+    @property
+    def typ(self):
+        '''(CompactNode) -> int
+
+        Return stdlib.FILE or stdlib.DIRECTORY
+
+        self : the view
+        '''
+
+        return self.tree.typ[self.index]
+
+    @property
+    def loaded(self):
+        '''(CompactNode) -> boolean
+
+        Return True, the children of every directory are read
+
+        self : the view
+        '''
+
+        return True
+
+    @property
+    def parent(self):
+        '''(CompactNode) -> CompactNode
+
+        Return the parent directory, None for the top
+
+        self : the view
+        '''
+
+        return self.tree.node(self.tree.parent[self.index])
+
+    @property
+    def children(self):
+        '''(CompactNode) -> list
+
+        Return the views of the children, smallest first
+
+        self : the view
+        '''
+
+        tree = self.tree
+        start = tree.first[self.index]
+        if start < 0:
+            return []
+        return [CompactNode(tree, node) for node in \
+                tree.order[start:start + tree.count[self.index]]]
+
+    def _sibling(self, step):
+        '''(CompactNode, int) -> CompactNode
+
+        Return the sibling step slots away, going round like the links of
+        systemIO.DirectoryInfo, None if there is no other sibling
+
+        self : the view
+        step : 1 for the next sibling, -1 for the previous one
+        '''
+
+        tree = self.tree
+        parent = tree.parent[self.index]
+        if parent < 0 or tree.count[parent] < 2:
+            return None
+        start = tree.first[parent]
+        slot = tree.slot[self.index] - start
+        slot = (slot + step) % tree.count[parent]
+        return CompactNode(tree, tree.order[start + slot])
+
+    @property
+    def next(self):
+        '''(CompactNode) -> CompactNode
+
+        Return the next sibling
+
+        self : the view
+        '''
+
+        return self._sibling(1)
+
+    @property
+    def previous(self):
+        '''(CompactNode) -> CompactNode
+
+        Return the previous sibling
+
+        self : the view
+        '''
+
+        return self._sibling(-1)
+
+    def _get_display_unit(self):
+        '''(CompactNode) -> display_unit.DisplayUnit
+
+        Return the display unit showing the file, None if it has none
+
+        self : the view
+        '''
+
+        return self.tree.display_units.get(self.index)
+
+    def _set_display_unit(self, unit):
+        '''(CompactNode, display_unit.DisplayUnit) -> NoneType
+
+        Remember the display unit showing the file
+
+        self : the view
+        unit : the display unit
+        '''
+
+        self.tree.display_units[self.index] = unit
+
+    display_unit = property(_get_display_unit, _set_display_unit)
+
+
+def same(file_info, other):
+    '''(object, object) -> boolean
+
+    Return True if both are the same file: the same object, or views of the
+    same node of a compact tree, which are made again on every access
+    The files of systemIO can not be compared with ==, it compares their
+    sizes
+
+    file_info : a file or a view
+    other : another file or view
+    '''
+
+    if file_info is other:
+        return True
+    return isinstance(file_info, CompactNode) and file_info == other
+
+
+def scan(scanner, path):
+    '''(scanner.Scanner, string) -> CompactTree
+
+    Return the compact tree of the directory at path, read with the
+    scanner without making an object for every file
+    Every directory is read, even if the scanner is lazy
+
+    scanner : the scanner reading the directories
+    path : the path of the directory
+    '''
+
+    tree = CompactTree(path)
+    scanner.syscalls = {}
+    # directories read but not yet filled in
+    waiting = {path: 0}
+    lazy_depth = scanner.lazy_depth
+    scanner.lazy_depth = None
+    try:
+        for directory_path, mtime, inode, entries in \
+            scanner.listings([path]):
+            node = waiting.pop(directory_path)
+            for sub_path, child in tree.add_children(node, entries):
+                waiting[sub_path] = child
+    finally:
+        scanner.lazy_depth = lazy_depth
+    tree.finish()
+    return tree
+
+
+def from_directory(root):
+    '''(systemIO.DirectoryInfo) -> CompactTree
+
+    Return the compact tree of a tree already scanned, with the children
+    in the same order
+
+    root : the top of the scanned tree
+    '''
+
+    tree = CompactTree(root.path)
+    stack = [(root, 0)]
+    while stack:
+        directory, node = stack.pop()
+        entries = []
+        for child in directory.children:
+            is_directory = child.typ == stdlib.DIRECTORY
+            size = child.size
+            if is_directory and child.loaded:
+                # it is added up from its children
+                size = 0
+            # the sizes of the links are already counted once
+            entries.append((child.path, is_directory, size, None))
+        sub_directories = tree.add_children(node, entries)
+        children = [child for child in directory.children \
+                    if child.typ == stdlib.DIRECTORY]
+        for i in range(0, len(children)):
+            stack.append((children[i], sub_directories[i][1]))
+    tree.finish()
+    return tree
+
@@ -1,6 +1,55 @@
 import pygame
 import stdlib
 
+# (name, size) -> pygame.font.Font, shared by all the controls
+_fonts = {}
+# (text, name, size, color) -> pygame.Surface
+_texts = stdlib.LRUCache(stdlib.TEXT_CACHE_SIZE)
+
+
+def get_font(name = None, size = None):
+    '''([string, int]) -> pygame.font.Font
+
+    Return the font, it is made only the first time it is asked for
+
+    name : the file of the font, stdlib.FONT_NAME if None
+    size : the size of the font, stdlib.FONT_SIZE if None
+    '''
+
+    if name is None:
+        name = stdlib.FONT_NAME
+    if size is None:
+        size = stdlib.FONT_SIZE
+    font = _fonts.get((name, size))
+    if font is None:
+        font = pygame.font.Font(name, size)
+        _fonts[(name, size)] = font
+    return font
+
+
+def render_text(text, color = stdlib.BLACK, name = None, size = None):
+    '''(string[, tuple, string, int]) -> pygame.Surface
+
+    Return the surface of the text drawn with the font, the last ones used
+    are kept so the same text is drawn only once
+
+    text : the text
+    color : the color of the text
+    name : the file of the font, stdlib.FONT_NAME if None
+    size : the size of the font, stdlib.FONT_SIZE if None
+    '''
+
+    if name is None:
+        name = stdlib.FONT_NAME
+    if size is None:
+        size = stdlib.FONT_SIZE
+    key = (text, name, size, color)
+    surface = _texts.get(key)
+    if surface is None:
+        surface = get_font(name, size).render(text, 1, color)
+        _texts.put(key, surface)
+    return surface
+
 
 class Control:
 
@@ -28,19 +77,45 @@ class Control:
         '''(Control) -> tuple
 
         Return the absolute position of the control
+        The controls above without a position yet are found going up the
+        parents, not by asking each parent, then set from the highest down
 
         self : the control
         '''
 
         if not self.abs_position:
-            # get the absolute position of the control's parent
-            parent_pos = self.parent.calculate_real_position()
-            self.abs_position = stdlib.Point(self.position.x + parent_pos.x, \
-                                             self.position.y + parent_pos.y)
+            # the controls whose position is not known, the lowest first
+            missing = []
+            control = self
+            while isinstance(control, Control) and not control.abs_position:
+                missing.append(control)
+                control = control.parent
+            # get the absolute position of the highest control's parent
+            parent_pos = control.calculate_real_position()
+            for control in reversed(missing):
+                control.abs_position = \
+                        stdlib.Point(control.position.x + parent_pos.x, \
+                                     control.position.y + parent_pos.y)
+                parent_pos = control.abs_position
         x = self.abs_position.x
         y = self.abs_position.y
         return stdlib.Point(x, y)
 
+    def invalidate(self):
+        '''(Control) -> NoneType
+
+        Tell the form the control was drawn, so its part of the screen is
+        shown at the end of the loop
+
+        self : the control
+        '''
+
+        pos = self.calculate_real_position()
+        form = self.parent
+        while isinstance(form, Control):
+            form = form.parent
+        form.invalidate((pos.x, pos.y, self.size.x, self.size.y))
+
     def dump_function(self, lst):
         '''(Object) -> NoneType
 
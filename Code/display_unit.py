@@ -1,66 +1,203 @@
 import button
 import stdlib
+import systemIO
+import compact_tree
+import layout
+import instrument
 import random
+import pygame
 
 
 class DisplayUnit(button.Button):
 
-    def __init__(self, position, size, parent, file_list):
-        '''(DisplayUnit, stdlib.Point, stdlib.Point, Object, list)
-                                                                  ->NoneType
+    def __init__(self, position, size, parent, file_list, \
+                 start = 0, end = None, prefix = None, \
+                 file_layout = None, hint = None, depth = 0, divide = True):
+        '''(DisplayUnit, stdlib.Point, stdlib.Point, Object, list
+               [, int, int, list, object, object, int, boolean]) ->NoneType
         Construct a display unit
+        The unit shows the files of file_list from start to end, the list
+        is shared by all the units of a directory instead of being copied
+        How the files are cut is decided by file_layout, see layout.py
 
         self : the display unit
         size : the size of the unit
         parent : the parant of the unit
         file_list : list of all file of the unit
+        start : the index of the first file of the unit
+        end : the index after the last file of the unit
+        prefix : the sums of the sizes of file_list, see _sum_sizes
+        file_layout : the layout, the one of stdlib.LAYOUT if None
+        hint : what the layout gave for these files
+        depth : how many directories are above the files
+        divide : False to leave the children to be constructed by the unit
+                 above, see _divide
         '''
         button.Button.__init__(self, position, "", size, \
                                self._get_random_color(), \
                                False, False, False)
         self.parent = parent
+        if end is None:
+            end = len(file_list)
+        if prefix is None:
+            prefix = self._sum_sizes(file_list)
         self.file_list = file_list
+        self.start = start
+        self.end = end
+        self.prefix = prefix
+        if file_layout is None:
+            file_layout = layout.get_layout(None)
+        self.file_layout = file_layout
+        self.hint = hint
+        self.depth = depth
         self.left = None
         self.right = None
         self.typ = stdlib.SECTION
         self.file_system_info = None
+        # True if the unit shows many files too small to be split
+        self.aggregate = False
+        # only for the top unit: the index of the files to find the one
+        # under the mouse, and the file under the mouse
+        self.index = None
+        self.hovered = None
         # if there is only 1 file or directory
-        if len(file_list) == 1:
-            # get the file or directory
-            self.file_system_info = file_list[0]
-            file_list[0].display_unit = self
-            if self.file_system_info.typ == stdlib.FILE:
-                self.typ = stdlib.FILE
-                self.list_info = None
-                self.soiled = True
-            else:
-                # if it is a directory, start to look at children
-                self.typ = stdlib.DIRECTORY
-                self.file_list = self.file_system_info.children
-                self.list_info = stdlib.Point(0, len(self.file_list) - 1)
+        if end - start == 1:
+            self._show(file_list[start])
+        elif self._too_small():
+            self._show_aggregate()
         # start to construct  children
-        self._divide()
+        if divide:
+            self._divide()
+
+    def _sum_sizes(self, file_list):
+        '''(DisplayUnit, list) -> list
+
+        Return the list of prefix sums of the sizes of the files: item i is
+        the total size of the first i files, so the size of the files from
+        start to end is prefix[end] - prefix[start]
+
+        self : the display unit
+        file_list : list of files
+        '''
+
+        prefix = [0]
+        total = 0
+        for file_system_info in file_list:
+            total += file_system_info.size
+            prefix.append(total)
+        return prefix
 
+    def _show(self, file_system_info):
+        '''(DisplayUnit, systemIO.FileSystemInfo) -> NoneType
+
+        Make the unit show only one file or directory
+        A directory whose children are not read yet is shown as a file
+        The units of a directory share a copy of its children, so the
+        ranges and sums of the units stay right when the tree puts the
+        children in order again, until the map is laid out again
+
+        self : the display unit
+        file_system_info : the file or directory
+        '''
+
+        # get the file or directory
+        self.file_system_info = file_system_info
+        file_system_info.display_unit = self
+        if file_system_info.typ == stdlib.FILE or \
+           not file_system_info.loaded or self._too_small():
+            self.typ = stdlib.FILE
+            self.list_info = None
+            self.soiled = True
+        else:
+            # if it is a directory, start to look at children
+            self.typ = stdlib.DIRECTORY
+            # the children start a new layout
+            self.hint = None
+            self.file_list = list(file_system_info.children)
+            self.start = 0
+            self.end = len(self.file_list)
+            self.prefix = self._sum_sizes(self.file_list)
+            self.list_info = stdlib.Point(0, len(self.file_list) - 1)
+            self.soiled = False
+
+    def _too_small(self):
+        '''(DisplayUnit) -> boolean
+
+        Return True if the unit is too small to be split, its files would
+        not be seen anyway
+
+        self : the display unit
+        '''
+
+        return self.size.x * self.size.y < stdlib.MIN_UNIT_AREA
+
+    def _show_aggregate(self):
+        '''(DisplayUnit) -> NoneType
+
+        Make the unit show all its files together as one file, instead of
+        a unit for each of them
+        Only the unit knows the files, they do not point to it, see
+        unit_of_child
+
+        self : the display unit
+        '''
+
+        self.aggregate = True
+        self.file_system_info = systemIO.AggregateInfo( \
+                self.file_list[self.start].parent, self.end - self.start, \
+                self.prefix[self.end] - self.prefix[self.start])
+        self.file_system_info.display_unit = self
+        self.typ = stdlib.FILE
+        self.list_info = None
+        self.soiled = True
+
+    @instrument.timed("layouts")
     def _divide(self):
         '''(DisplayUnit) -> NoneType
 
-        Construct the children (left and right)
+        Construct the children (left and right), theirs and so on down to
+        the files
+        The units waiting to be split are kept on a stack instead of every
+        unit dividing its children, so a deep tree does not reach the limit
+        of recursion
+
+        self : the display unit
+        '''
+
+        stack = [self]
+        while stack:
+            unit = stack.pop()
+            unit._split()
+            # the left one first, as the units are drawn
+            if unit.right:
+                stack.append(unit.right)
+            if unit.left:
+                stack.append(unit.left)
+
+    def _split(self):
+        '''(DisplayUnit) -> NoneType
+
+        Construct the children (left and right), without their children
 
         self : the display unit
         '''
 
         # only do this if we have a section or a directory
         if self.typ != stdlib.FILE:
-            index, percent, total = self._partition()
             # if the size is 0 then we do nothing
-            if total == 0:
+            if self.prefix[self.end] == self.prefix[self.start]:
                 return
+            depth = self.depth
+            if self.typ == stdlib.DIRECTORY:
+                depth += 1
             # determine children should be draw from left to right or top down
-            drawing_direction = self.size.x > self.size.y
-            first_half = self.file_list[:index]
-            second_half = self.file_list[index:]
+            index, percent, drawing_direction, first_hint, second_hint = \
+                   self.file_layout.split(self.prefix, self.start, self.end, \
+                                          self.size, depth, self.hint)
+            first_half = (self.start, index, first_hint, depth)
+            second_half = (index, self.end, second_hint, depth)
             # if fisrt halft is empty then there will be only second half
-            if not first_half:
+            if index == self.start:
                 first_half = second_half
                 second_half = None
                 percent = 1
@@ -72,26 +209,186 @@ class DisplayUnit(button.Button):
                       second_half, \
                       self._second_children_pos, self._second_children_size)
 
+    def relayout(self):
+        '''(DisplayUnit) -> NoneType
+
+        Construct the children again from the current children of its
+        directory and redraw the unit, keeping its position and size
+        Used on the top unit when the tree has changed
+
+        self : the display unit
+        '''
+
+        self.left = None
+        self.right = None
+        self.condition = stdlib.NORMAL
+        if self.aggregate:
+            self._show_aggregate()
+        elif self.file_system_info:
+            self._show(self.file_system_info)
+        self._divide()
+        self._erase()
+        self.draw()
+        # the new map is what hover and selection are drawn over
+        self._form().keep(self.screen_rect())
+        self.invalidate()
+        top = self._top()
+        if top.index:
+            top.index.replace(self)
+
+    def _top(self):
+        '''(DisplayUnit) -> DisplayUnit
+
+        Return the top unit of the map
+
+        self : the display unit
+        '''
+
+        unit = self
+        while isinstance(unit.parent, DisplayUnit):
+            unit = unit.parent
+        return unit
+
+    def on_map(self, top):
+        '''(DisplayUnit, DisplayUnit) -> boolean
+
+        Return True if the unit is on the map of top, and not left from a
+        layout of its part of the map which was made again
+
+        self : the display unit
+        top : the top unit of the map
+        '''
+
+        unit = self
+        while unit is not top:
+            parent = unit.parent
+            if not isinstance(parent, DisplayUnit) or \
+               (parent.left is not unit and parent.right is not unit):
+                return False
+            unit = parent
+        return True
+
+    def unit_of_child(self, file_system_info):
+        '''(DisplayUnit, systemIO.FileSystemInfo) -> DisplayUnit
+
+        Return the unit showing a child of the directory shown by the unit:
+        its own unit, or the unit of the small files it is shown with
+        Return None if it is not on the map
+
+        self : the display unit of the directory
+        file_system_info : the child
+        '''
+
+        index = -1
+        for i in range(self.start, self.end):
+            if compact_tree.same(self.file_list[i], file_system_info):
+                index = i
+                break
+        if index < 0:
+            return None
+        # go down the units to the one of the child
+        unit = self
+        while not unit.aggregate:
+            next_unit = None
+            for child in (unit.left, unit.right):
+                if child is None:
+                    continue
+                if child.file_system_info and not child.aggregate:
+                    # a unit showing one file or directory
+                    if compact_tree.same(child.file_system_info, \
+                                         file_system_info):
+                        return child
+                elif child.start <= index < child.end:
+                    next_unit = child
+            if next_unit is None:
+                return None
+            unit = next_unit
+        return unit
+
+    def _form(self):
+        '''(DisplayUnit) -> win_form.WinForm
+
+        Return the form showing the map
+
+        self : the display unit
+        '''
+
+        return self._top().parent
+
+    def screen_rect(self):
+        '''(DisplayUnit) -> tuple
+
+        Return (x, y, width, height) of the unit on the screen
+
+        self : the display unit
+        '''
+
+        pos = self.calculate_real_position()
+        return (pos.x, pos.y, self.size.x, self.size.y)
+
+    def _erase(self):
+        '''(DisplayUnit) -> NoneType
+
+        Fill the unit with the background color of the form, so an empty
+        part of the map does not show what was there before
+
+        self : the display unit
+        '''
+
+        form = self._form()
+        pygame.draw.rect(form.screen, form.current_color, self.screen_rect())
+
+    def _restore(self):
+        '''(DisplayUnit) -> NoneType
+
+        Put back the unit as it is on the map, without hover or click,
+        instead of drawing it again
+
+        self : the display unit
+        '''
+
+        self._form().restore(self.screen_rect())
+
+    def show_selected(self, selected):
+        '''(DisplayUnit, boolean) -> NoneType
+
+        Draw or remove the border showing the unit is selected
+
+        self : the display unit
+        selected : True to draw the border
+        '''
+
+        self.border = selected
+        if selected:
+            button.Button.draw(self)
+            self.invalidate()
+        else:
+            self._restore()
+
     def _create_child(self, percent, drawing_direction, \
-                      file_list, pos_function, size_function):
-        '''(DisplayUnit, float, boolean, list, stdlib.Point, stdlib.Point)
+                      file_range, pos_function, size_function):
+        '''(DisplayUnit, float, boolean, tuple, stdlib.Point, stdlib.Point)
                                                               -> DisplayUnit
         Return display unit construted from the percent, drawing_direction,
-        file list and 2 function
+        range of files and 2 function
         Two function will compute the possition and size of the unit
 
         self : the display unit
         percent : the percentage of the children
         drawing_direction : indicating how to draw the unit
-        file_list : the list of file of children
+        file_range : (start, end, hint, depth) of the files of children in
+                     self.file_list
         pos_function : function to calculate the child position
         size_function : function to calculate the child size
         '''
 
-        if file_list:
+        if file_range:
             pos = pos_function(percent, drawing_direction)
             size = size_function(percent, drawing_direction)
-            return DisplayUnit(pos, size, self, file_list)
+            return DisplayUnit(pos, size, self, self.file_list, \
+                               file_range[0], file_range[1], self.prefix, \
+                               self.file_layout, file_range[2], \
+                               file_range[3], False)
 
     def _first_children_pos(self, percent, drawing_direction):
         '''(DisplayUnit, float, boolean) -> stdlib.Point
@@ -156,48 +453,31 @@ class DisplayUnit(button.Button):
           - self.left.size.y * (not drawing_direction)
         return stdlib.Point(x, y)
 
-    def _partition(self):
-        '''DisplayUnit -> int, float, int
-
-        Return the pivot index, the percentage of the first partition and
-        the total size of data
-        Precondition : self.file_list is sorted
-
-        self : the display unit
-        '''
-
-        lst = self.file_list
-        total = 0
-        # get the total
-        for i in range(0, len(lst)):
-            total += lst[i].size
-        if total == 0:
-            return 0, 0, 0
-        else:
-            s = 0
-            # go add in
-            for i in range(0, len(lst)):
-                s += lst[i].size
-                # find the pivot
-                if s * 2 > total:
-                    break
-            s -= lst[i].size
-            return i, float(s) / float(total), total
-
     def draw(self):
         '''(DisplayUnit) -> NoneType
 
         Draw everything - including children
+        The units are taken from a stack: a unit, then its children, then
+        its border again over them, the unit being put back on the stack to
+        be finished after its children
 
         self : the display unit
         '''
 
-        button.Button.draw(self)
-        if self.left:
-            self.left.draw()
-        if self.right:
-            self.right.draw()
-        button.Button._draw(self)
+        # (unit, True if only its border is left to draw)
+        stack = [(self, False)]
+        while stack:
+            unit, finished = stack.pop()
+            if finished:
+                button.Button._draw(unit)
+                continue
+            button.Button.draw(unit)
+            if unit.left or unit.right:
+                stack.append((unit, True))
+                if unit.right:
+                    stack.append((unit.right, False))
+                if unit.left:
+                    stack.append((unit.left, False))
 
     def _get_random_color(self):
         '''(DisplayUnit) -> tuple
@@ -212,65 +492,38 @@ class DisplayUnit(button.Button):
         b = random.randint(50, 255)
         return (r, g, b)
 
-    def _return_right_event(self, event, return_function):
-        '''(DisplayUnit, pygame.Event, function) -> [function, list]
-
-        Process any mouse event for internal repsond(only affect the children
-        of the unit)
-        Return the external respond(will be indicate later) and its arguments
-
-        self : the display unit
-        event : the event having information to handle
-        return_function : a function to be called
-        '''
-
-        result_right = [[], []]
-        result_left = [[], []]
-        if self.left:
-            result_left = self.left.mouse_event(event)
-        if self.right:
-            result_right = self.right.mouse_event(event)
-        # if have data back from left child
-        if result_right[1]:
-            return [return_function, result_right[1]]
-        # if have data back from right child
-        elif result_left[1]:
-            # if have no data back from any child
-            return [return_function, result_left[1]]
-        else:
-            return [self.dump_function, []]
-
     def _draw_refresh(self):
         '''(DisplayUnit) -> NoneType
 
-        Set the condtion back to nomarl condtion and redraw everything,
-        including children
+        Set the condtion back to nomarl condtion, including children, and
+        put back the files which were hovered or clicked
+        Only the units under the mouse are not normal, the others are left
 
         self : the display unit
         '''
 
-        # set back to normal stage
-        self.condition = stdlib.NORMAL
-        # if it is a file
-        if self.typ == stdlib.FILE:
-            # just draw it out
-            self.draw()
-        else:
-            # draw non empty children
-            if self.left:
-                self.left._draw_refresh()
-            if self.right:
-                self.right._draw_refresh()
-            # if it is a directory
-            if self.typ == stdlib.DIRECTORY:
-                # just draw it self
-                button.Button.draw(self)
+        stack = [self]
+        while stack:
+            unit = stack.pop()
+            # set back to normal stage
+            unit.condition = stdlib.NORMAL
+            # if it is a file
+            if unit.typ == stdlib.FILE:
+                # just put it back
+                unit._restore()
+            else:
+                # go down to the file under the mouse
+                if unit.right and unit.right.condition != stdlib.NORMAL:
+                    stack.append(unit.right)
+                if unit.left and unit.left.condition != stdlib.NORMAL:
+                    stack.append(unit.left)
 
     def local_act_mouse_hover(self, event):
         '''(Button, pygame.Event) -> [function, lst]
 
         Process mouse hover event for internal repsond(only affect the unit)
-        Return the external respond(will be indicate later) and its arguments
+        Return the external respond(will be indicate later) and its arguments,
+        the children are asked by mouse_event
 
         self : the display unit
         event : the event having information to handle
@@ -279,17 +532,16 @@ class DisplayUnit(button.Button):
         self.condition = stdlib.HOVER
         if self.typ == stdlib.FILE:
             self.draw()
+            self.invalidate()
             return [self.mouse_hover, [self.file_system_info]]
-        else:
-            result = self._return_right_event(event, self.mouse_hover)
-            button.Button._draw(self)
-            return result
+        return [self.mouse_hover, []]
 
     def local_act_mouse_down(self, event):
         '''(Button, pygame.Event) -> [function, lst]
 
         Process mouse down event for internal repsond(only affect the unit)
-        Return the external respond(will be indicate later) and its arguments
+        Return the external respond(will be indicate later) and its arguments,
+        the children are asked by mouse_event
 
         self : the display unit
         event : the event having information to handle
@@ -298,17 +550,16 @@ class DisplayUnit(button.Button):
         self.condition = stdlib.CLICK
         if self.typ == stdlib.FILE:
             self.draw()
+            self.invalidate()
             return [self.mouse_down, [self.file_system_info]]
-        else:
-            result = self._return_right_event(event, self.mouse_down)
-            button.Button._draw(self)
-            return result
+        return [self.mouse_down, []]
 
     def local_act_mouse_up(self, event):
         '''(Button, pygame.Event) -> [function, lst]
 
         Process mouse up event for internal repsond(only affect the unit)
-        Return the external respond(will be indicate later) and its argument
+        Return the external respond(will be indicate later) and its argument,
+        the children are asked by mouse_event
 
         self : the display unit
         event : the event having information to handle
@@ -318,12 +569,10 @@ class DisplayUnit(button.Button):
             if self.condition == stdlib.CLICK:
                 self.condition = stdlib.NORMAL
                 self.draw()
+                self.invalidate()
                 return [self.mouse_click, [self.file_system_info]]
-            return [[], []]
-        else:
-            result = self._return_right_event(event, self.mouse_click)
-            button.Button._draw(self)
-            return result
+            return [self.dump_function, []]
+        return [self.mouse_click, []]
 
     def local_act_no_interaction(self, event):
         '''(Button, pygame.Event) -> [function, lst]
@@ -338,11 +587,91 @@ class DisplayUnit(button.Button):
 
         # because there is no interaction
         if self.condition != stdlib.NORMAL:
-            # then set it back to normal
-            self.condition = stdlib.NORMAL
-            # and redraw it and its children
-            if self.typ == stdlib.FILE:
-                self.draw()
-            else:
-                self._draw_refresh()
+            # then put it and its children back to normal
+            self._draw_refresh()
         return [self.no_focus, []]
+
+    def mouse_event(self, event):
+        '''(DisplayUnit, pygame.Event) -> list:[function, lst]
+
+        Handle any mouse event on the map
+        Return the external respond (will be indicate later) for an event with
+        its agurments in another list
+        If the unit has an index, the file under the mouse is found in it and
+        only that file and the one which was under the mouse before are
+        drawn again, instead of asking every unit
+        Otherwise the units under the mouse are asked one by one from a
+        stack, see _ask_units
+
+        self : the display unit
+        event : the event having information to handle
+        '''
+
+        if self.index is None:
+            return self._ask_units(event)
+        unit = self.index.find(event.pos[0], event.pos[1])
+        hovered = self.hovered
+        if hovered and hovered is not unit:
+            hovered.condition = stdlib.NORMAL
+            hovered._restore()
+        self.hovered = unit
+        if not unit:
+            return [self.no_focus, []]
+        if event.type == pygame.MOUSEMOTION:
+            result = [self.mouse_hover, [unit.file_system_info]]
+            if unit.condition != stdlib.NORMAL:
+                # still on the same file
+                return result
+            unit.condition = stdlib.HOVER
+        elif event.type == pygame.MOUSEBUTTONDOWN:
+            result = [self.mouse_down, [unit.file_system_info]]
+            unit.condition = stdlib.CLICK
+        elif event.type == pygame.MOUSEBUTTONUP:
+            if unit.condition != stdlib.CLICK:
+                return [self.dump_function, []]
+            result = [self.mouse_click, [unit.file_system_info]]
+            unit.condition = stdlib.NORMAL
+        unit.draw()
+        unit.invalidate()
+        return result
+
+    def _ask_units(self, event):
+        '''(DisplayUnit, pygame.Event) -> list:[function, lst]
+
+        Handle a mouse event on the map without an index: every unit under
+        the mouse handles it, its children being put on a stack rather than
+        asked by the unit, so a deep tree does not reach the limit of
+        recursion
+        If 2 files are under the mouse, the right or lower one is given,
+        and the border of a unit is drawn again over its children
+
+        self : the display unit
+        event : the event having information to handle
+        '''
+
+        mouse_pos = stdlib.Point(event.pos[0], event.pos[1])
+        result = button.Button.mouse_event(self, event)
+        found = result[1]
+        # the units under the mouse with children, the highest first
+        under = []
+        stack = [self]
+        while stack:
+            unit = stack.pop()
+            if unit is not self:
+                unit_result = button.Button.mouse_event(unit, event)
+                if unit_result[1]:
+                    found = unit_result[1]
+            if unit.typ != stdlib.FILE and \
+               mouse_pos.inside(unit.abs_position, unit.size):
+                under.append(unit)
+                if unit.right:
+                    stack.append(unit.right)
+                if unit.left:
+                    stack.append(unit.left)
+        for unit in reversed(under):
+            button.Button._draw(unit)
+        if found:
+            return [result[0], found]
+        if under:
+            return [self.dump_function, []]
+        return result
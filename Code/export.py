@@ -0,0 +1,232 @@
+import stdlib
+import scanner
+import snapshot
+import layout
+import codecs
+import csv
+import json
+import os.path
+import optparse
+import struct
+import sys
+# run with: python export.py [options] folder
+
+# the binary file starts with the magic string and the version
+HEADER = struct.Struct("<8sI")
+MAGIC = "TREEMAPX"
+VERSION = 2
+# then one record for every file or directory: size, type, depth, x, y,
+# width, height and length of the path, followed by the path itself
+# the depth and the length have 32 bits, a path can be longer than 65535
+# bytes when it is made of many directories
+RECORD = struct.Struct("<qBIiiiiI")
+FIELDS = ["path", "size", "type", "depth", "x", "y", "width", "height"]
+TYPE_NAMES = {stdlib.FILE: "file", stdlib.DIRECTORY: "directory"}
+FORMATS = ["ndjson", "csv", "binary"]
+
+
+def _escape_bytes(error):
+    '''(UnicodeDecodeError) -> tuple
+
+    Return every byte which is not utf-8 as the character U+DC80 to
+    U+DCFF, as python 3 does with "surrogateescape", so the bytes can be
+    got back from the text, and where to go on decoding
+    It is registered under a name of its own, so the error handlers of the
+    rest of the program are not changed
+
+    error : the error of the decoder
+    '''
+
+    bad = error.object[error.start:error.end]
+    return u"".join([unichr(0xdc00 + ord(byte)) for byte in bad]), error.end
+
+codecs.register_error("treemap.escape_bytes", _escape_bytes)
+
+
+def records(root, position, size, file_layout = None):
+    '''(systemIO.DirectoryInfo, stdlib.Point, stdlib.Point[, object])
+                                                                -> generator
+    Yield (path, size, type, depth, x, y, width, height) for every file and
+    directory of the tree, one at a time so nothing is kept for the whole
+    tree
+    The path is encoded in utf-8 and the type is "file" or "directory"
+
+    root : the top of the tree
+    position : the position of the map
+    size : the size of the map
+    file_layout : the layout, the one of stdlib.LAYOUT if None
+    '''
+
+    for file_system_info, depth, x, y, width, height in \
+        layout.walk(root, position, size, file_layout):
+        path = file_system_info.path
+        if isinstance(path, unicode):
+            path = path.encode("utf-8")
+        yield path, file_system_info.size, \
+              TYPE_NAMES[file_system_info.typ], depth, x, y, width, height
+
+
+def write_ndjson(rows, output):
+    '''(iterable, file) -> int
+
+    Write one JSON object on every line, return the number of lines
+
+    rows : the records
+    output : where to write
+    '''
+
+    count = 0
+    for row in rows:
+        item = dict(zip(FIELDS, row))
+        # the bytes of a path which are not utf-8 are written as U+DC80 to
+        # U+DCFF, python 3 gets them back with encode("utf-8",
+        # "surrogateescape")
+        item["path"] = row[0].decode("utf-8", "treemap.escape_bytes")
+        output.write(json.dumps(item, sort_keys = True))
+        output.write("\n")
+        count += 1
+    return count
+
+
+def write_csv(rows, output):
+    '''(iterable, file) -> int
+
+    Write the records as CSV with a header line, return the number of
+    records
+
+    rows : the records
+    output : where to write
+    '''
+
+    writer = csv.writer(output)
+    writer.writerow(FIELDS)
+    count = 0
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+    return count
+
+
+def write_binary(rows, output):
+    '''(iterable, file) -> int
+
+    Write the records in the binary format, see RECORD, return the number
+    of records
+
+    rows : the records
+    output : where to write
+    '''
+
+    output.write(HEADER.pack(MAGIC, VERSION))
+    count = 0
+    for path, size, typ, depth, x, y, width, height in rows:
+        code = stdlib.FILE
+        if typ == "directory":
+            code = stdlib.DIRECTORY
+        output.write(RECORD.pack(size, code, depth, x, y, width, height, \
+                                 len(path)))
+        output.write(path)
+        count += 1
+    return count
+
+
+def read_binary(source):
+    '''(file) -> generator
+
+    Yield the records of a file written by write_binary
+    Raise ValueError if it is not such a file
+
+    source : where to read
+    '''
+
+    magic, version = HEADER.unpack(source.read(HEADER.size))
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("not a treemap export")
+    while True:
+        data = source.read(RECORD.size)
+        if not data:
+            return
+        size, typ, depth, x, y, width, height, length = RECORD.unpack(data)
+        yield source.read(length), size, TYPE_NAMES[typ], depth, \
+              x, y, width, height
+
+WRITERS = {"ndjson": write_ndjson, "csv": write_csv, "binary": write_binary}
+
+
+def export(root, output, file_format = "ndjson", size = None, \
+           file_layout = None):
+    '''(systemIO.DirectoryInfo, file[, string, stdlib.Point, object]) -> int
+
+    Write every file and directory of the tree with its place on the map,
+    return the number of records written
+
+    root : the top of the tree
+    output : where to write
+    file_format : "ndjson", "csv" or "binary"
+    size : the size of the map, the one of the main form if None
+    file_layout : the layout, the one of stdlib.LAYOUT if None
+    '''
+
+    if size is None:
+        size = stdlib.Point(1004, 510)
+    rows = records(root, stdlib.Point(0, 0), size, file_layout)
+    return WRITERS[file_format](rows, output)
+
+
+def main(arguments):
+    '''(list) -> int
+
+    Export the folder given on the command line
+    Return 0 if it was written
+    The number of system calls made to read the folder is written on the
+    error output, so it is not mixed with the export
+
+    arguments : the command line, without the name of the program
+    '''
+
+    parser = optparse.OptionParser( \
+        usage = "python export.py [options] folder")
+    parser.add_option("-f", "--format", choices = FORMATS, \
+                      default = "ndjson", \
+                      help = "one of " + ", ".join(FORMATS) + " [%default]")
+    parser.add_option("-o", "--output", \
+                      help = "file to write, the screen if not given")
+    parser.add_option("-s", "--size", default = "1004x510", \
+                      help = "size of the map [%default]")
+    parser.add_option("-l", "--layout", choices = sorted(layout.LAYOUTS), \
+                      help = "how the map is cut, one of " + \
+                             ", ".join(sorted(layout.LAYOUTS)))
+    parser.add_option("--snapshot", action = "store_true", \
+                      default = False, \
+                      help = "read only the directories changed since the " \
+                             "last snapshot, files changed in place keep " \
+                             "their old size")
+    options, paths = parser.parse_args(arguments)
+    if len(paths) != 1:
+        parser.error("give one folder")
+    try:
+        size = stdlib.parse_size(options.size)
+    except ValueError:
+        parser.error("the size must be WIDTHxHEIGHT: " + options.size)
+    folder_scanner = scanner.Scanner()
+    # the same path as the form gives, so they share the snapshot
+    path = os.path.abspath(paths[0])
+    if options.snapshot:
+        root = snapshot.open_tree(path, folder_scanner)
+    else:
+        root = folder_scanner.scan(path)
+    output = sys.stdout
+    if options.output:
+        output = open(options.output, "wb")
+    try:
+        export(root, output, options.format, size, \
+               layout.get_layout(options.layout))
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    sys.stderr.write("%d system calls\n" % folder_scanner.syscall_count())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
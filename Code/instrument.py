@@ -0,0 +1,274 @@
+import stdlib
+import json
+import os
+import time
+# turn on with: TREEMAP_INSTRUMENT=1 python treemap.py
+
+# True if the counters and times are recorded
+# When it is False the decorators give back the functions as they are, so
+# nothing is slower, and the callers test it before counting anything
+enabled = stdlib.INSTRUMENT or bool(os.environ.get("TREEMAP_INSTRUMENT"))
+
+
+class Histogram(object):
+
+    def __init__(self):
+        '''(Histogram) -> NoneType
+
+        Construct an empty histogram
+        Every value is counted in the bucket of the smallest power of 2 not
+        below it, so the buckets are 1, 2, 4, 8 ...
+
+        self : the histogram
+        '''
+
+        self.count = 0
+        self.total = 0
+        self.smallest = None
+        self.largest = None
+        # upper bound of the bucket -> number of values
+        self.buckets = {}
+
+    def add(self, value):
+        '''(Histogram, number) -> NoneType
+
+        Count one value
+
+        self : the histogram
+        value : the value
+        '''
+
+        self.count += 1
+        self.total += value
+        if self.smallest is None or value < self.smallest:
+            self.smallest = value
+        if self.largest is None or value > self.largest:
+            self.largest = value
+        bucket = 1
+        while bucket < value:
+            bucket *= 2
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+
+    def mean(self):
+        '''(Histogram) -> float
+
+        Return the mean of the values, 0 if there is none
+
+        self : the histogram
+        '''
+
+        if not self.count:
+            return 0.0
+        return self.total / float(self.count)
+
+    def to_dict(self):
+        '''(Histogram) -> dict
+
+        Return the histogram as a dictionary which can be written as JSON
+
+        self : the histogram
+        '''
+
+        return {"count": self.count, \
+                "total": self.total, \
+                "mean": self.mean(), \
+                "min": self.smallest, \
+                "max": self.largest, \
+                "buckets": [[bucket, self.buckets[bucket]] \
+                            for bucket in sorted(self.buckets)]}
+
+
+class Statistics(object):
+
+    def __init__(self):
+        '''(Statistics) -> NoneType
+
+        Construct empty counters and histograms
+
+        self : the statistics
+        '''
+
+        self.start = time.time()
+        self.frames = 0
+        # name -> total count
+        self.counters = {}
+        # name -> count since the last frame
+        self.frame_counters = {}
+        # name -> Histogram, of times in microseconds or of counts per
+        # frame
+        self.histograms = {}
+        # name -> number of calls of a timed function not returned yet
+        self.running = {}
+
+    def count(self, name, amount = 1):
+        '''(Statistics, string[, int]) -> NoneType
+
+        Add amount to a counter
+
+        self : the statistics
+        name : the name of the counter
+        amount : what is added
+        '''
+
+        self.counters[name] = self.counters.get(name, 0) + amount
+        self.frame_counters[name] = self.frame_counters.get(name, 0) + amount
+
+    def record(self, name, value):
+        '''(Statistics, string, number) -> NoneType
+
+        Add a value to a histogram
+
+        self : the statistics
+        name : the name of the histogram
+        value : the value
+        '''
+
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram()
+        histogram.add(value)
+
+    def end_frame(self):
+        '''(Statistics) -> NoneType
+
+        Put what every counter counted during the frame in its "per frame"
+        histogram, called once every loop of the form
+
+        self : the statistics
+        '''
+
+        self.frames += 1
+        for name in self.counters:
+            self.record(name + " per frame", self.frame_counters.get(name, 0))
+        self.frame_counters = {}
+
+    def rate(self, name):
+        '''(Statistics, string) -> float
+
+        Return the count of a counter for each second since the start
+
+        self : the statistics
+        name : the name of the counter
+        '''
+
+        seconds = max(time.time() - self.start, 1e-6)
+        return self.counters.get(name, 0) / seconds
+
+    def lines(self):
+        '''(Statistics) -> list
+
+        Return a short line of text for every counter and every time, to
+        be shown over the form
+
+        self : the statistics
+        '''
+
+        lines = []
+        for name in sorted(self.counters):
+            per_frame = self.histograms.get(name + " per frame")
+            line = "%s %.0f/s" % (name, self.rate(name))
+            if per_frame:
+                line += ", %.1f/frame, max %d" % (per_frame.mean(), \
+                                                  per_frame.largest)
+            lines.append(line)
+        for name in sorted(self.histograms):
+            if name.endswith(" time"):
+                histogram = self.histograms[name]
+                lines.append("%s %.2f ms, max %.2f ms" % \
+                             (name, histogram.mean() / 1000.0, \
+                              histogram.largest / 1000.0))
+        return lines
+
+    def to_dict(self):
+        '''(Statistics) -> dict
+
+        Return everything recorded as a dictionary which can be written as
+        JSON
+
+        self : the statistics
+        '''
+
+        seconds = time.time() - self.start
+        return {"seconds": seconds, \
+                "frames": self.frames, \
+                "counters": self.counters, \
+                "rates": dict((name, self.rate(name)) \
+                              for name in self.counters), \
+                "histograms": dict((name, self.histograms[name].to_dict()) \
+                                   for name in self.histograms)}
+
+# what was recorded since the program started
+statistics = Statistics()
+
+
+def timed(name):
+    '''(string) -> function
+
+    Return a decorator counting the calls of a function as name and putting
+    the time they take in microseconds in the histogram "name time"
+    A call made while another call of the same name is running is counted
+    but its time is not, it is already in the time of the outer call
+    If instrumentation is off, the function is given back as it is
+
+    name : the name of the counter
+    '''
+
+    def decorator(function):
+        if not enabled:
+            return function
+
+        def wrapper(*arguments, **keywords):
+            statistics.count(name)
+            running = statistics.running.get(name, 0)
+            statistics.running[name] = running + 1
+            start = time.time()
+            try:
+                return function(*arguments, **keywords)
+            finally:
+                statistics.running[name] = running
+                if not running:
+                    statistics.record(name + " time", \
+                                      (time.time() - start) * 1e6)
+        wrapper.__name__ = function.__name__
+        wrapper.__doc__ = function.__doc__
+        return wrapper
+    return decorator
+
+
+def count(name, amount = 1):
+    '''(string[, int]) -> NoneType
+
+    Add amount to a counter
+    Callers test enabled first, so nothing is done when it is off
+
+    name : the name of the counter
+    amount : what is added
+    '''
+
+    statistics.count(name, amount)
+
+
+def end_frame():
+    '''() -> NoneType
+
+    Close the counters of the frame, see Statistics.end_frame
+    '''
+
+    statistics.end_frame()
+
+
+def dump(path = None):
+    '''([string]) -> NoneType
+
+    Write everything recorded to a JSON file
+
+    path : the file, stdlib.INSTRUMENT_FILE if None
+    '''
+
+    if path is None:
+        path = stdlib.INSTRUMENT_FILE
+    output = open(path, "w")
+    try:
+        json.dump(statistics.to_dict(), output, indent = 2, sort_keys = True)
+    finally:
+        output.close()
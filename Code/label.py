@@ -59,13 +59,16 @@ class Label(control.Control):
 
         control.Control.draw(self)
         self._erase_content()
+        # the old text may be longer than the new one
+        self.invalidate()
         # set font
-        self.font = pygame.font.Font(None, 20)
-        text_surface = self.font.render(self.text, 1, stdlib.BLACK)
+        self.font = control.get_font()
+        text_surface = control.render_text(self.text)
         # get the size for future erase
-        text_size = self.font.size(self.text)
+        text_size = text_surface.get_size()
         self.size = stdlib.Point(text_size[0], text_size[1])
         pos = self.calculate_real_position()
         # change into tuple
         pos = (pos.x, pos.y)
         self.screen.blit(text_surface, pos)
+        self.invalidate()
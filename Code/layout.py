@@ -0,0 +1,287 @@
+import stdlib
+import bisect
+
+
+class BinaryLayout(object):
+    # the name shown in the statistics
+    name = "binary"
+
+    def split(self, prefix, start, end, size, depth, hint):
+        '''(BinaryLayout, list, int, int, stdlib.Point, int, object) -> tuple
+
+        Return how to cut the files from start to end in 2:
+        (index, percent, direction, first hint, second hint)
+        The files from start to index go in the first part, which takes
+        percent of the unit, the others in the second part
+        direction is True to cut from left to right, False from top to
+        bottom
+        The hints are given back when the parts are cut again
+        This one cuts where the sum of the sizes passes half of the total,
+        along the longer side
+        Precondition : the files are sorted and their total is not 0
+
+        self : the layout
+        prefix : the sums of the sizes, see display_unit.DisplayUnit
+        start : the index of the first file
+        end : the index after the last file
+        size : the size of the unit
+        depth : how many directories are above the files
+        hint : the hint given for the files, None at first
+        '''
+
+        base = prefix[start]
+        total = prefix[end] - base
+        # the first end where the sum is more than half of the total
+        index = bisect.bisect_right(prefix, base + total // 2, \
+                                    start + 1, end + 1)
+        # the pivot is the last file of that sum
+        index -= 1
+        return index, _percent(prefix, start, index, end), \
+               size.x > size.y, None, None
+
+
+class SliceLayout(object):
+    name = "slice"
+
+    def split(self, prefix, start, end, size, depth, hint):
+        '''(SliceLayout, list, int, int, stdlib.Point, int, object) -> tuple
+
+        Return how to cut the files from start to end in 2, see
+        BinaryLayout.split
+        All the files of a directory are put side by side in strips, from
+        left to right for the top directory, then from top to bottom for
+        its sub-directories, and so on
+
+        self : the layout
+        prefix : the sums of the sizes, see display_unit.DisplayUnit
+        start : the index of the first file
+        end : the index after the last file
+        size : the size of the unit
+        depth : how many directories are above the files
+        hint : the hint given for the files, None at first
+        '''
+
+        index = (start + end) // 2
+        return index, _percent(prefix, start, index, end), \
+               depth % 2 == 1, None, None
+
+
+class SquarifiedLayout(object):
+    name = "squarified"
+
+    def split(self, prefix, start, end, size, depth, hint):
+        '''(SquarifiedLayout, list, int, int, stdlib.Point, int, object)
+                                                                    -> tuple
+        Return how to cut the files from start to end in 2, see
+        BinaryLayout.split
+        The biggest files are put in a row along the shorter side, adding
+        files while the row gets closer to squares, then the rest of the
+        files are laid out the same way
+        The files of a row are cut along the row, the hint is the direction
+        To keep the units from going too deep, more than SQUARIFY_LIMIT
+        files are first cut in half like BinaryLayout
+
+        self : the layout
+        prefix : the sums of the sizes, see display_unit.DisplayUnit
+        start : the index of the first file
+        end : the index after the last file
+        size : the size of the unit
+        depth : how many directories are above the files
+        hint : the hint given for the files, None at first
+        '''
+
+        if hint is not None:
+            # the files of a row
+            index = (start + end) // 2
+            return index, _percent(prefix, start, index, end), \
+                   hint, hint, hint
+        if end - start > stdlib.SQUARIFY_LIMIT or \
+           min(size.x, size.y) <= 0:
+            # a unit of no size has no squares either
+            return _binary.split(prefix, start, end, size, depth, hint)
+        base = prefix[start]
+        total = float(prefix[end] - base)
+        direction = size.x > size.y
+        side = float(min(size.x, size.y))
+        # pixels for every byte
+        scale = size.x * size.y / total
+        # the files are sorted, the row starts from the biggest one
+        index = end - 1
+        biggest = prefix[end] - prefix[index]
+        worst = _worst(biggest, biggest, biggest, side, scale)
+        while index > start:
+            row = prefix[end] - prefix[index - 1]
+            smallest = prefix[index] - prefix[index - 1]
+            next_worst = _worst(row, biggest, smallest, side, scale)
+            if next_worst > worst:
+                break
+            worst = next_worst
+            index -= 1
+        # the row is the second part, the files inside are cut across
+        return index, _percent(prefix, start, index, end), \
+               direction, None, not direction
+
+_binary = BinaryLayout()
+
+
+def _worst(row, biggest, smallest, side, scale):
+    '''(number, number, number, float, float) -> float
+
+    Return the worst ratio of the longer side over the shorter side of the
+    files of a row
+
+    row : the sum of the sizes of the files of the row
+    biggest : the size of the biggest file of the row
+    smallest : the size of the smallest file of the row
+    side : the length of the row in pixels
+    scale : pixels for every byte
+    '''
+
+    # the width of the row, the files share its length
+    width = row * scale / side
+    worst = 0
+    for file_size in (biggest, smallest):
+        # a file of size 0 is never seen, it should not change the row
+        if file_size:
+            length = file_size * scale / width
+            worst = max(worst, width / length, length / width)
+    return worst
+
+
+def _percent(prefix, start, index, end):
+    '''(list, int, int, int) -> float
+
+    Return the part of the total size of the files from start to end taken
+    by the files from start to index
+
+    prefix : the sums of the sizes
+    start : the index of the first file
+    index : the index where the files are cut
+    end : the index after the last file
+    '''
+
+    base = prefix[start]
+    return float(prefix[index] - base) / float(prefix[end] - base)
+
+LAYOUTS = {"binary": BinaryLayout(), "slice": SliceLayout(), \
+           "squarified": SquarifiedLayout()}
+
+
+def get_layout(name):
+    '''(string) -> object
+
+    Return the layout having that name, stdlib.LAYOUT if it is None
+
+    name : "binary", "slice", "squarified" or None
+    '''
+
+    if name is None:
+        name = stdlib.LAYOUT
+    return LAYOUTS[name]
+
+
+def statistics(unit):
+    '''(display_unit.DisplayUnit) -> dict
+
+    Return how easy to read the map is: the number of files shown, the
+    number too thin to be seen, the mean, median and worst ratio of the
+    longer side over the shorter side of the files, and the number of
+    slivers, the files with a ratio above SLIVER_RATIO
+
+    unit : the top display unit of the map
+    '''
+
+    ratios = []
+    hidden = 0
+    stack = [unit]
+    while stack:
+        unit = stack.pop()
+        if unit.typ == stdlib.FILE:
+            shorter = min(unit.size.x, unit.size.y)
+            if shorter <= 0:
+                hidden += 1
+            else:
+                ratios.append(float(max(unit.size.x, unit.size.y)) / shorter)
+        for child in (unit.left, unit.right):
+            if child:
+                stack.append(child)
+    result = {"files": len(ratios) + hidden, "hidden": hidden, \
+              "mean": 0.0, "median": 0.0, "worst": 0.0, "slivers": 0}
+    if ratios:
+        ratios.sort()
+        result["mean"] = sum(ratios) / len(ratios)
+        result["median"] = ratios[len(ratios) // 2]
+        result["worst"] = ratios[-1]
+        result["slivers"] = len(ratios) - \
+                            bisect.bisect_right(ratios, stdlib.SLIVER_RATIO)
+    return result
+
+
+def walk(root, position, size, file_layout = None):
+    '''(systemIO.DirectoryInfo, stdlib.Point, stdlib.Point[, object])
+                                                                -> generator
+    Yield (file, depth, x, y, width, height) for every file and directory
+    of the tree, with the rectangle display_unit.DisplayUnit gives it,
+    without making the display units
+    Files too small to be split are not put together, and the files of a
+    list of size 0 get an empty rectangle
+    Only the lists of the directories being laid out are kept, not the
+    whole map
+
+    root : the top of the tree
+    position : the position of the map
+    size : the size of the map
+    file_layout : the layout, the one of stdlib.LAYOUT if None
+    '''
+
+    if file_layout is None:
+        file_layout = get_layout(None)
+    # pieces of the map: list of files, its prefix sums, the files from
+    # start to end, the hint, the depth and the rectangle
+    stack = [([root], [0, root.size], 0, 1, None, 0, \
+              position.x, position.y, size.x, size.y)]
+    while stack:
+        file_list, prefix, start, end, hint, depth, x, y, width, height = \
+                   stack.pop()
+        if end - start == 1:
+            file_system_info = file_list[start]
+            yield file_system_info, depth, x, y, width, height
+            if file_system_info.typ == stdlib.FILE or \
+               not file_system_info.loaded:
+                continue
+            # lay out the children in the same rectangle
+            file_list = file_system_info.children
+            prefix = [0]
+            for child in file_list:
+                prefix.append(prefix[-1] + child.size)
+            start, end, hint, depth = 0, len(file_list), None, depth + 1
+            if not file_list:
+                continue
+        if prefix[end] == prefix[start]:
+            # nothing to see, but every file is still given
+            for i in range(end - 1, start - 1, -1):
+                stack.append((file_list, prefix, i, i + 1, None, depth, \
+                              x, y, 0, 0))
+            continue
+        index, percent, direction, first_hint, second_hint = \
+               file_layout.split(prefix, start, end, \
+                                 stdlib.Point(width, height), depth, hint)
+        if index == start:
+            # the first part is empty, the second one takes everything
+            stack.append((file_list, prefix, start, end, second_hint, \
+                          depth, x, y, width, height))
+            continue
+        if direction:
+            first_width = int(float(width) * percent)
+            stack.append((file_list, prefix, index, end, second_hint, \
+                          depth, x + first_width, y, width - first_width, \
+                          height))
+            stack.append((file_list, prefix, start, index, first_hint, \
+                          depth, x, y, first_width, height))
+        else:
+            first_height = int(float(height) * percent)
+            stack.append((file_list, prefix, index, end, second_hint, \
+                          depth, x, y + first_height, width, \
+                          height - first_height))
+            stack.append((file_list, prefix, start, index, first_hint, \
+                          depth, x, y, width, first_height))
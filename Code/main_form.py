@@ -3,28 +3,87 @@ import button
 import label
 import stdlib
 import media
+import session
+import snapshot
 import systemIO
+import compact_tree
+import watcher
+import pygame
+import time
 import display_unit
+import unit_index
 import key_handler
 
 
 class MainForm(win_form.WinForm):
 
-    def __init__(self, path):
-        '''(MainForm, string) -> NoneType
+    def __init__(self, path, form_session = None):
+        '''(MainForm, string[, session.Session]) -> NoneType
 
         Construct the main form
 
         self : the form
         path : the path of the folder
+        form_session : the trees already loaded, a new session if None
         '''
 
         win_form.WinForm.__init__(self, stdlib.Point(1024, 650))
-        self.file_system_info = systemIO.DirectoryInfo(path)
+        if form_session is None:
+            form_session = session.Session()
+        self.session = form_session
+        self.scanner = form_session.scanner
+        self.watcher = None
+        self.last_watch = 0
+        # the maps of the folders shown before
+        self.layouts = stdlib.LRUCache(stdlib.ZOOM_CACHE_SIZE)
+        self._open(path)
         self.selecting = None
-        self.path = ""
         self.set_up_GUI()
 
+    def _open(self, path):
+        '''(MainForm, string) -> NoneType
+
+        Get the tree of the folder at path from the session and start
+        watching it
+
+        self : the form
+        path : the path of the folder
+        '''
+
+        # the top of the tree, the folder shown on the map, the scanned
+        # folder or one inside it, and the scan running in the background
+        # if there was no snapshot
+        self.file_system_info, self.shown, self.progress = \
+                               self.session.open(path)
+        self.next_layout = 0
+        self.layout_pending = False
+        # True if directories were read after the snapshot was saved
+        self.unsaved = False
+        # a compact tree is not watched
+        if not self.progress and not stdlib.COMPACT_TREE:
+            self._start_watching()
+
+    def _leave(self):
+        '''(MainForm) -> NoneType
+
+        Stop working on the tree shown, it stays in the session unless it
+        was still being scanned
+
+        self : the form
+        '''
+
+        if self.unsaved:
+            snapshot.save_tree(self.file_system_info)
+            self.unsaved = False
+        if self.progress:
+            # a tree read in part is not kept
+            self.progress.stop()
+            self.session.forget(self.file_system_info)
+            self.progress = None
+        if self.watcher:
+            self.watcher.close()
+            self.watcher = None
+
     def _set_up_buttons(self):
         '''(MainForm) -> NoneType
 
@@ -33,12 +92,15 @@ class MainForm(win_form.WinForm):
         self : the form
         '''
 
-        button_text = ["Exit", "Refresh", "Load folder"]
+        button_text = ["Exit", "Refresh", "Load folder", "Zoom in", \
+                       "Zoom out"]
         button_function = [self.halt, \
                            self.refresh, \
-                           self.open_folder]
+                           self.open_folder, \
+                           self.zoom_in, \
+                           self.zoom_out]
         self.buttons = []
-        for i in range(0, 3):
+        for i in range(0, len(button_text)):
             bt = button.Button(stdlib.Point(914 - 110 * i, 600), \
                                button_text[i])
             bt.mouse_click = button_function[i]
@@ -53,7 +115,7 @@ class MainForm(win_form.WinForm):
         '''
 
         self.lb_start_up = label.Label(stdlib.Point(30, 580), "Start up : ")
-        self.lb_start_up.text = "Start up : " + self.file_system_info.path
+        self.lb_start_up.text = self._start_up_text()
         self.lb_selected = label.Label(stdlib.Point(30, 560), "Selected : ")
         self.lb_hovering = label.Label(stdlib.Point(30, 540), "Hovering : ")
 
@@ -68,6 +130,25 @@ class MainForm(win_form.WinForm):
         self.key_handler = key_handler.KeyHandler()
         self.key_handler.key_handle = self.key
 
+    def _start_up_text(self):
+        '''(MainForm) -> string
+
+        Return the text of the start up label: the scanned folder, and the
+        folder shown on the map if it is another one
+
+        self : the form
+        '''
+
+        text = "Start up : " + self.file_system_info.path
+        if self.shown.path != self.file_system_info.path:
+            text += "   Showing : " + self.shown.path
+        if self.progress:
+            text += " (scanning)"
+        if self.watcher and self.watcher.full:
+            text += " (too many folders to watch, checked every %d s)" % \
+                    (stdlib.WATCH_REFRESH_INTERVAL / 1000)
+        return text
+
     def _set_up_map(self):
         '''(MainForm) -> NoneType
 
@@ -76,14 +157,27 @@ class MainForm(win_form.WinForm):
         self : the form
         '''
 
-        self.display_unit = display_unit.DisplayUnit(stdlib.Point(10, 10), \
-                                                stdlib.Point(1004, 510), \
-                                                self, \
-                                                [self.file_system_info])
+        self.display_unit = self._create_map(self.shown)
+
+    def _create_map(self, directory):
+        '''(MainForm, systemIO.DirectoryInfo) -> display_unit.DisplayUnit
+
+        Return the top unit of a new map of the directory, with its index
+
+        self : the form
+        directory : the directory shown on the map
+        '''
+
+        unit = display_unit.DisplayUnit(stdlib.Point(10, 10), \
+                                        stdlib.Point(1004, 510), \
+                                        self, [directory])
+        unit.index = unit_index.UnitIndex(unit.position, unit.size)
+        unit.index.replace(unit)
         # setup function respond for treemap
-        self.display_unit.mouse_hover = self.hover
-        self.display_unit.mouse_click = self.click
-        self.display_unit.no_focus = self.no_focus
+        unit.mouse_hover = self.hover
+        unit.mouse_click = self.click
+        unit.no_focus = self.no_focus
+        return unit
 
     def _add_controls(self):
         '''(MainForm) -> NoneType
@@ -93,7 +187,7 @@ class MainForm(win_form.WinForm):
         self : the form
         '''
 
-        for i in range(0, 3):
+        for i in range(0, len(self.buttons)):
             self.add_control(self.buttons[i])
         self.add_control(self.lb_start_up)
         self.add_control(self.lb_selected)
@@ -116,27 +210,221 @@ class MainForm(win_form.WinForm):
         self._add_controls()
 
     def show_dialog(self):
-        '''(WinForm) -> string
+        '''(MainForm) -> NoneType
 
-        Return the path of chosen folder
+        Show the form until it is closed, other folders are loaded in the
+        same form
 
         self : the form
         '''
 
         win_form.WinForm.show_dialog(self)
-        return self.path
+        self._leave()
+
+    def _start_watching(self):
+        '''(MainForm) -> NoneType
+
+        Start watching the folder for changes if it is possible
+
+        self : the form
+        '''
+
+        if stdlib.WATCH_FOLDER and watcher.available():
+            try:
+                self.watcher = watcher.Watcher(self.file_system_info, \
+                                               self.scanner)
+            except OSError:
+                # run without watching
+                self.watcher = None
+
+    def _show_progress(self):
+        '''(MainForm) -> NoneType
+
+        Add what the background scan has read to the map
+        The map is laid out again at most every PROGRESS_INTERVAL, and
+        never spending more than a fifth of the time laying out
+
+        self : the form
+        '''
+
+        if self.progress.poll(stdlib.PROGRESS_BUDGET):
+            self.layout_pending = True
+        if self.layout_pending and \
+           (self.progress.done or time.time() >= self.next_layout):
+            start = time.time()
+            self._show_changes([self.file_system_info])
+            cost = time.time() - start
+            self.next_layout = time.time() + \
+                               max(stdlib.PROGRESS_INTERVAL, 4 * cost)
+            self.layout_pending = False
+        if self.progress.done:
+            self.progress = None
+            snapshot.save_tree(self.file_system_info)
+            self._start_watching()
+            self.lb_start_up.Text(self._start_up_text())
+
+    def idle(self):
+        '''(MainForm) -> boolean
+
+        Show the part of the folder scanned so far and the changes of the
+        folder seen by the watcher
+        Return True while the folder is being scanned
+
+        self : the form
+        '''
+
+        if self.progress:
+            self._show_progress()
+        now = pygame.time.get_ticks()
+        if self.watcher and now - self.last_watch >= stdlib.WATCH_INTERVAL:
+            self.last_watch = now
+            full = self.watcher.full
+            changed = self.watcher.poll()
+            if changed:
+                self._show_changes(changed)
+            if self.watcher.full != full:
+                # the system ran out of watches
+                self.lb_start_up.Text(self._start_up_text())
+        return self.progress is not None
 
     def refresh(self, obj):
         '''(WinForm, list) -> NoneType
 
-        Process when user does not hover on any display unit
+        Read the whole folder again, keeping the tree and the map in place,
+        so files which only changed their size are seen too
 
         self : the form
         obj : nothing
         '''
 
-        self.path = self.file_system_info.path
-        self.close()
+        if self.progress:
+            # the scan is not done yet, there is nothing to refresh
+            return
+        if stdlib.COMPACT_TREE:
+            # a compact tree can not be changed, read it all again
+            self.session.forget(self.file_system_info)
+            self.load(self.file_system_info.path)
+            return
+        changed = snapshot.refresh_tree(self.file_system_info, self.scanner, \
+                                        True)
+        if self.watcher:
+            self.watcher.rewatch()
+        self._show_changes(changed)
+
+    def _show_changes(self, changed):
+        '''(MainForm, list) -> NoneType
+
+        Lay out again and redraw the map if a changed directory is on it
+        The whole map is laid out again, not only the changed directories:
+        their sizes change the share of every directory above them, and the
+        folders above them have their children put in order again
+
+        self : the form
+        changed : list of systemIO.DirectoryInfo
+        '''
+
+        # the maps of the other folders may be out of date
+        self.layouts.clear()
+        if not self._in_tree(self.shown, self.file_system_info):
+            # the shown folder is gone, show the whole folder again
+            self.zoom(self.file_system_info)
+            self.layouts.clear()
+            return
+        selected = None
+        if self.selecting:
+            selected = self.selecting.file_system_info
+        self._deselected()
+        self.selecting = None
+        if self._shown_part(changed):
+            self.display_unit.relayout()
+        # keep the selection if the file is still there
+        if selected and self._in_tree(selected, self.shown):
+            self.selecting = self._unit_of(selected)
+            self._set_selected()
+
+    def restore(self, rect):
+        '''(MainForm, tuple) -> NoneType
+
+        Put back a part of the screen as it was kept in the cache, keeping
+        the border of the selected unit
+
+        self : the form
+        rect : (x, y, width, height) of the part
+        '''
+
+        win_form.WinForm.restore(self, rect)
+        selecting = self.selecting
+        if selecting and selecting.border and \
+           pygame.Rect(rect).colliderect(selecting.screen_rect()):
+            button.Button.draw(selecting)
+
+    def _shown_part(self, directories):
+        '''(MainForm, list) -> list
+
+        Return the directories of the list which are on the map: the ones
+        inside the shown directory, and the shown directory instead of the
+        ones above it
+
+        self : the form
+        directories : list of systemIO.DirectoryInfo
+        '''
+
+        result = []
+        for directory in directories:
+            if self._in_tree(directory, self.shown):
+                result.append(directory)
+            elif self._in_tree(self.shown, directory):
+                result.append(self.shown)
+        return result
+
+    def _in_tree(self, file_info, top):
+        '''(MainForm, systemIO.FileSystemInfo, systemIO.DirectoryInfo)
+                                                                -> boolean
+
+        Return True if the file is still in the tree under top
+        A file taken out of the tree loses its parent, so going up the
+        parents reaches top only if the file and every directory above it
+        are still there
+        The files shown together as one are never in the tree, they are
+        made again by every layout
+
+        self : the form
+        file_info : the file
+        top : the top of the tree
+        '''
+
+        if isinstance(file_info, systemIO.AggregateInfo):
+            return False
+        while file_info is not None:
+            if compact_tree.same(file_info, top):
+                return True
+            file_info = file_info.parent
+        return False
+
+    def _unit_of(self, file_info):
+        '''(MainForm, systemIO.FileSystemInfo) -> display_unit.DisplayUnit
+
+        Return the display unit of the file on the current map, None if it
+        has none: it is too small or it is only on the map of another
+        folder
+        A file shown with its small siblings as one unit does not point to
+        it, the unit is found from the unit of its directory
+
+        self : the form
+        file_info : the file
+        '''
+
+        unit = file_info.display_unit
+        if unit and unit.on_map(self.display_unit):
+            return unit
+        parent = file_info.parent
+        if parent is None:
+            return None
+        unit = parent.display_unit
+        if unit and unit.typ == stdlib.DIRECTORY and \
+           unit.on_map(self.display_unit):
+            return unit.unit_of_child(file_info)
+        return None
 
     def no_focus(self, obj):
         '''(WinForm, list) -> NoneType
@@ -185,8 +473,7 @@ class MainForm(win_form.WinForm):
         '''
 
         if self.selecting:
-            self.selecting.border = True
-            self.selecting.draw()
+            self.selecting.show_selected(True)
             self.lb_selected.Text("Selected : " +\
                                   self.selecting.file_system_info.path)
 
@@ -199,8 +486,7 @@ class MainForm(win_form.WinForm):
         '''
 
         if self.selecting:
-            self.selecting.border = False
-            self.selecting.draw()
+            self.selecting.show_selected(False)
 
     def key(self, obj):
         '''(WinForm, list) -> NoneType
@@ -211,10 +497,20 @@ class MainForm(win_form.WinForm):
         obj : the selected unit
         '''
 
-        if obj and self.selecting:
+        if obj and obj[0] in stdlib.ZOOM_IN:
+            self.zoom_in([])
+        elif obj and obj[0] in stdlib.ZOOM_OUT:
+            self.zoom_out([])
+        elif obj and obj[0] in stdlib.UP and self.selecting and \
+             self.selecting.file_system_info.path == self.shown.path:
+            # going up from the top of the map shows the folder above
+            self.zoom_out([])
+        elif obj and self.selecting:
             self._deselected()
             # get file info
             selecting = self.selecting.file_system_info
+            # the files next to the shown folder are not on the map
+            on_top = selecting.path == self.shown.path
             # process when user press up - go up 1 level
             if obj[0] in stdlib.UP:
                 # only go up when there is a parent
@@ -225,20 +521,170 @@ class MainForm(win_form.WinForm):
                 # only go down when it is a directory
                 # and it is not empty
                 if selecting.typ == stdlib.DIRECTORY:
-                    if selecting.size:
+                    self._expand(selecting)
+                    if selecting.size and selecting.children:
                         selecting = selecting.children[0]
             # process when user press right - go to next child
             elif obj[0] in stdlib.RIGHT:
-                if selecting.next:
+                if selecting.next and not on_top:
                     selecting = selecting.next
             # process when user press right - go to previous child
             elif obj[0] in stdlib.LEFT:
-                if selecting.previous:
+                if selecting.previous and not on_top:
                     selecting = selecting.previous
-            # get display unit
-            self.selecting = selecting.display_unit
+            # get display unit, a file inside a directory too small to be
+            # split has none so the selection stays
+            unit = self._unit_of(selecting)
+            if unit:
+                self.selecting = unit
+            self._set_selected()
+
+    def _expand(self, directory):
+        '''(MainForm, systemIO.DirectoryInfo) -> NoneType
+
+        Read the children of a directory left unread and show them
+
+        self : the form
+        directory : the directory
+        '''
+
+        if directory.loaded:
+            return
+        self.scanner.expand(directory)
+        # the sizes of the folders above have changed
+        self.layouts.clear()
+        if self._shown_part([directory]):
+            self.display_unit.relayout()
+        self.unsaved = True
+        if self.watcher:
+            self.watcher.rewatch()
+
+    def zoom_in(self, obj):
+        '''(MainForm, list) -> NoneType
+
+        Show the selected folder, or the folder of the selected file, on the
+        whole map
+
+        self : the form
+        obj : nothing
+        '''
+
+        if not self.selecting:
+            return
+        directory = self.selecting.file_system_info
+        if directory.typ != stdlib.DIRECTORY:
+            directory = directory.parent
+        if directory and directory.path != self.shown.path:
+            self.zoom(directory)
+            self.selecting = self._unit_of(directory)
             self._set_selected()
 
+    def zoom_out(self, obj):
+        '''(MainForm, list) -> NoneType
+
+        Show the folder above the shown folder, with the folder which was
+        shown selected
+
+        self : the form
+        obj : nothing
+        '''
+
+        if not self.shown.parent:
+            return
+        shown = self.shown
+        self.zoom(shown.parent)
+        # select the folder, or what it is shown in if it is too small
+        while shown and not self._unit_of(shown):
+            shown = shown.parent
+        if shown:
+            self.selecting = self._unit_of(shown)
+            self._set_selected()
+
+    def zoom(self, directory):
+        '''(MainForm, systemIO.DirectoryInfo) -> NoneType
+
+        Show the directory on the whole map, using the tree already read
+        The map shown before is kept, so showing its folder again is
+        instant, and the map of the directory is reused if it was kept
+
+        self : the form
+        directory : the directory, inside the scanned folder
+        '''
+
+        self._expand(directory)
+        self._deselected()
+        self.selecting = None
+        rect = self.display_unit.screen_rect()
+        # the map as it is drawn, without hover and selection
+        image = pygame.Surface((rect[2], rect[3]))
+        image.blit(self.cache, (0, 0), rect)
+        # the maps are forgotten when the tree changes, so a path always
+        # means the same directory
+        self.layouts.put(self.shown.path, (self.display_unit, image))
+        kept = self.layouts.get(directory.path)
+        if kept:
+            unit = kept[0]
+            # the files point to the units of the last map they were on
+            stack = [unit]
+            while stack:
+                item = stack.pop()
+                if item.file_system_info:
+                    item.file_system_info.display_unit = item
+                if item.left:
+                    stack.append(item.left)
+                if item.right:
+                    stack.append(item.right)
+            self._show_map(unit, kept[1])
+        else:
+            self._show_map(self._create_map(directory))
+        self.shown = directory
+        self.lb_start_up.Text(self._start_up_text())
+
+    def _show_map(self, unit, image = None):
+        '''(MainForm, display_unit.DisplayUnit[, pygame.Surface]) -> NoneType
+
+        Put the map in the place of the one shown and draw it, or put back
+        its image if it was drawn before
+
+        self : the form
+        unit : the top unit of the map
+        image : the map as it was drawn
+        '''
+
+        old = self.display_unit
+        if old.hovered:
+            old.hovered.condition = stdlib.NORMAL
+            old.hovered = None
+        rect = old.screen_rect()
+        if image:
+            self.screen.blit(image, rect[:2])
+        else:
+            pygame.draw.rect(self.screen, self.current_color, rect)
+            unit.draw()
+        self.controls[self.controls.index(old)] = unit
+        self.display_unit = unit
+        self.keep(rect)
+        self.invalidate(rect)
+
+    def load(self, path):
+        '''(MainForm, string) -> NoneType
+
+        Show the folder at path in the same form, the trees the session has
+        already read are used instead of being read again
+
+        self : the form
+        path : the path of the folder
+        '''
+
+        self._leave()
+        self._deselected()
+        self.selecting = None
+        self.layouts.clear()
+        self._open(path)
+        self._show_map(self._create_map(self.shown))
+        self.lb_start_up.Text(self._start_up_text())
+        self.lb_selected.Text("Selected : ")
+
     def halt(self, obj):
         '''(MainForm, list) -> NoneType
 
@@ -261,5 +707,4 @@ class MainForm(win_form.WinForm):
 
         folder_name = media.choose_folder()
         if folder_name:
-            self.path = folder_name
-            self.close()
+            self.load(folder_name)
@@ -0,0 +1,746 @@
+import stdlib
+import systemIO
+import instrument
+import os
+import os.path
+import Queue
+import threading
+import time
+import multiprocessing
+import multiprocessing.pool
+import warnings
+# os.scandir is only in python 3.5+, older python needs the scandir package
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+
+
+def read_directory(path):
+    '''(string) -> tuple
+
+    Return the path of the directory, its modified time and inode, a list
+    of (path, is directory, size, link) for every entry of the directory
+    and a dictionary counting the system calls made to read it
+    The size of a directory entry is always 0, link is the device and inode
+    of a file with several hard links, see systemIO.link_key
+    The entries left out by stdlib.EXCLUDE are not even looked at, links
+    and mount points are treated as systemIO.read_entry says
+    This is a module function so that it can be sent to a worker process
+
+    path : the path of the directory
+    '''
+
+    entries = []
+    calls = {"listdir": 1, "stat": 1}
+    try:
+        # take the time before reading so a change while reading is seen
+        # as a change by the next refresh
+        info = os.stat(path)
+        names = os.listdir(path)
+    except OSError:
+        # an unreadable directory is shown as an empty one
+        return path, None, None, entries, calls
+    for filename in names:
+        if systemIO.excluded(filename):
+            continue
+        subitem = os.path.join(path, filename)
+        try:
+            is_directory, size, link = \
+                          systemIO.read_entry(subitem, info.st_dev, calls)
+        except OSError:
+            # the file is gone
+            is_directory, size, link = False, 0, None
+        entries.append((subitem, is_directory, size, link))
+    return path, info.st_mtime, info.st_ino, entries, calls
+
+
+def scan_directory(path):
+    '''(string) -> tuple
+
+    Same as read_directory, but take the type of every entry from the
+    directory itself and only stat the files to get their size
+    The type is free when the file system fills it in the directory entry
+    (most local file systems do), otherwise scandir stats the entry by itself
+    and that call is not counted
+    A directory removed while it is read keeps the entries read so far
+
+    path : the path of the directory
+    '''
+
+    entries = []
+    calls = {"scandir": 1, "stat": 1}
+    try:
+        info = os.stat(path)
+        iterator = scandir(path)
+    except OSError:
+        # an unreadable directory is shown as an empty one
+        return path, None, None, entries, calls
+    try:
+        for entry in iterator:
+            if systemIO.excluded(entry.name):
+                continue
+            if entry.is_symlink() or \
+               (stdlib.ONE_FILE_SYSTEM and \
+                entry.is_dir(follow_symlinks = False)):
+                # the link or the device of the directory decides what it is
+                try:
+                    is_directory, size, link = \
+                                  systemIO.read_entry(entry.path, \
+                                                      info.st_dev, calls)
+                except OSError:
+                    # the file is gone
+                    is_directory, size, link = False, 0, None
+                entries.append((entry.path, is_directory, size, link))
+            elif entry.is_dir():
+                entries.append((entry.path, True, 0, None))
+            else:
+                calls["stat"] += 1
+                try:
+                    file_info = entry.stat()
+                    size = systemIO.file_size(file_info)
+                    link = systemIO.link_key(file_info)
+                except OSError:
+                    # the file is gone or it is a broken link
+                    size, link = 0, None
+                entries.append((entry.path, False, size, link))
+    except OSError:
+        # the directory was removed while it was read
+        pass
+    return path, info.st_mtime, info.st_ino, entries, calls
+
+
+def measure_directory(path):
+    '''(string) -> tuple
+
+    Return the path of the directory, the total size of all the files under
+    it, a dictionary of the files with several hard links and a dictionary
+    counting the system calls made, like du
+    No object is made for the files, so it is much faster than a scan
+    The files with several hard links are not in the total, they are in the
+    dictionary, device and inode -> size, so the caller counts each of them
+    once even if it has links in other directories
+
+    path : the path of the directory
+    '''
+
+    if scandir:
+        read = scan_directory
+    else:
+        read = read_directory
+    total = 0
+    links = {}
+    calls = {}
+    stack = [path]
+    while stack:
+        directory_path, mtime, inode, entries, read_calls = \
+                        read(stack.pop())
+        for name in read_calls:
+            calls[name] = calls.get(name, 0) + read_calls[name]
+        for entry_path, is_directory, size, link in entries:
+            if is_directory:
+                stack.append(entry_path)
+            elif link is None:
+                total += size
+            else:
+                links[link] = size
+    return path, total, links, calls
+
+
+class Scanner(object):
+
+    def __init__(self, workers = stdlib.SCAN_WORKERS, \
+                 use_process = stdlib.SCAN_USE_PROCESS, \
+                 mode = stdlib.SCAN_MODE, \
+                 lazy_depth = stdlib.LAZY_DEPTH):
+        '''(Scanner[, int, boolean, int, int]) -> NoneType
+
+        Construct a scanner which reads directories in a pool of workers
+
+        self : the scanner
+        workers : the number of directories being read at the same time
+        use_process : use a pool of processes instead of a pool of threads
+        mode : stdlib.SCAN_LISTDIR or stdlib.SCAN_SCANDIR
+        lazy_depth : how many levels of directories are read, deeper
+                     directories only get their total size, None to read
+                     everything
+        '''
+
+        self.workers = workers
+        self.use_process = use_process
+        self.mode = mode
+        self.lazy_depth = lazy_depth
+        # kind of system call -> number of calls made by the last scan,
+        # refresh or expand, see syscall_count
+        self.syscalls = {}
+
+    def _read_function(self):
+        '''(Scanner) -> function
+
+        Return the function reading one directory for the current mode
+        Fall back to listdir if scandir is not available, with a warning
+        as it makes a stat for every entry
+
+        self : the scanner
+        '''
+
+        if self.read_mode() == stdlib.SCAN_SCANDIR:
+            return scan_directory
+        if self.mode == stdlib.SCAN_SCANDIR:
+            # shown once, see the warnings module
+            warnings.warn("scandir is not available, install the scandir " \
+                          "package, directories are read with listdir", \
+                          RuntimeWarning)
+        return read_directory
+
+    def read_mode(self):
+        '''(Scanner) -> int
+
+        Return how the directories are really read: stdlib.SCAN_SCANDIR, or
+        stdlib.SCAN_LISTDIR if it was asked or scandir is not available
+
+        self : the scanner
+        '''
+
+        if self.mode == stdlib.SCAN_SCANDIR and scandir:
+            return stdlib.SCAN_SCANDIR
+        return stdlib.SCAN_LISTDIR
+
+    def _count(self, calls):
+        '''(Scanner, dict) -> NoneType
+
+        Add the system calls made to read a directory to self.syscalls
+
+        self : the scanner
+        calls : the number of calls of every kind
+        '''
+
+        for name in calls:
+            self.syscalls[name] = self.syscalls.get(name, 0) + calls[name]
+
+    def syscall_count(self):
+        '''(Scanner) -> int
+
+        Return the total number of system calls made by the last scan
+
+        self : the scanner
+        '''
+
+        return sum(self.syscalls.values())
+
+    def _create_pool(self):
+        '''(Scanner) -> multiprocessing.pool.Pool
+
+        Return a new pool of workers
+
+        self : the scanner
+        '''
+
+        if self.use_process:
+            return multiprocessing.Pool(self.workers)
+        return multiprocessing.pool.ThreadPool(self.workers)
+
+    def _reads(self, level):
+        '''(Scanner, int) -> boolean
+
+        Return True if the directories at the level under a top directory
+        are read, the top directory being at level 0
+
+        self : the scanner
+        level : the level of the directory
+        '''
+
+        return self.lazy_depth is None or level < self.lazy_depth
+
+    def listings(self, paths, known = None):
+        '''(Scanner, list[, dict]) -> generator
+
+        Yield (path, modified time, inode, entries) for every directory in
+        paths and every directory under them, in the order they are read
+        A directory is always yielded before its sub-directories
+        Directories deeper than self.lazy_depth are not read, nor the
+        directories in known and the ones under them
+        The system calls made are added to self.syscalls
+
+        self : the scanner
+        paths : the paths of the top directories
+        known : path -> systemIO.DirectoryInfo of trees already read
+        '''
+
+        pool = self._create_pool()
+        # the directories waiting to be read, None stops the pool
+        waiting = Queue.Queue()
+        # path -> level under its top directory
+        levels = {}
+        for path in paths:
+            waiting.put(path)
+            levels[path] = 0
+        pending = len(paths)
+        if not pending:
+            waiting.put(None)
+        try:
+            # chunks must be of size 1, the queue is filled while reading
+            for directory_path, mtime, inode, entries, calls in \
+                pool.imap_unordered(self._read_function(), \
+                                    iter(waiting.get, None)):
+                pending -= 1
+                self._count(calls)
+                level = levels.pop(directory_path) + 1
+                for entry_path, is_directory, size, link in entries:
+                    if is_directory and self._reads(level) and \
+                       not (known and entry_path in known):
+                        pending += 1
+                        levels[entry_path] = level
+                        waiting.put(entry_path)
+                yield directory_path, mtime, inode, entries
+                if not pending:
+                    waiting.put(None)
+        finally:
+            # let the pool stop even if the caller stops early
+            waiting.put(None)
+            pool.terminate()
+            pool.join()
+
+    def scan(self, path, known = None):
+        '''(Scanner, string[, dict]) -> systemIO.DirectoryInfo
+
+        Return the directory at path with all of its children read
+        The trees in known are put in the tree as they are instead of being
+        read again
+        The new directory keeps its own record of hard links, see
+        systemIO.links_of
+
+        self : the scanner
+        path : the path of the directory
+        known : path -> systemIO.DirectoryInfo of trees under path already
+                read
+        '''
+
+        self.syscalls = {}
+        root = systemIO.DirectoryInfo(path, None, False)
+        self.fill([root], known)
+        return root
+
+    @instrument.timed("scans")
+    def fill(self, directories, known = None):
+        '''(Scanner, list[, dict]) -> NoneType
+
+        Read all the children of every directory in the list
+        Directories deeper than self.lazy_depth are left unread, with only
+        their total size
+        Directories in known are put in the tree as they are, not read
+        Precondition : every directory has no children yet
+
+        self : the scanner
+        directories : list of systemIO.DirectoryInfo
+        known : path -> systemIO.DirectoryInfo of trees already read
+        '''
+
+        if not directories:
+            return
+        # directories to be read, with their level under a top directory
+        waiting = {}
+        for directory in directories:
+            waiting[directory.path] = (directory, 0)
+        order = []
+        unread = []
+        for directory_path, mtime, inode, entries in \
+            self.listings(waiting.keys(), known):
+            directory, level = waiting.pop(directory_path)
+            directory.mtime = mtime
+            directory.inode = inode
+            order.append(directory)
+            for sub_directory in self._attach(directory, entries, known):
+                if self._reads(level + 1):
+                    waiting[sub_directory.path] = (sub_directory, level + 1)
+                else:
+                    sub_directory.loaded = False
+                    unread.append(sub_directory)
+        self._measure(unread)
+        # sub-directories are always after their parent, so go backward to
+        # have the size of every child before its parent
+        for directory in reversed(order):
+            directory.update()
+        # a link counted before may have given its size to a new one, the
+        # directories read are up to date and the callers update the ones
+        # above them
+        record = systemIO.links_of(directories[0], False)
+        if record:
+            updated = set(id(directory) for directory in order)
+            systemIO.update_parents([directory for directory in \
+                                     record.take_changed() \
+                                     if id(directory) not in updated])
+
+    def _measure(self, directories):
+        '''(Scanner, list) -> NoneType
+
+        Set the size of every directory in the list to the total size of
+        the files under it, without reading its children
+        A file with several hard links is left out if one of its links was
+        already read in the tree, otherwise it is counted in the directory
+        of smallest path having one of its links
+
+        self : the scanner
+        directories : list of systemIO.DirectoryInfo
+        '''
+
+        if not directories:
+            return
+        self._set_measures(directories, \
+                           self._measure_paths([item.path for item in \
+                                                directories]))
+
+    def _measure_paths(self, paths):
+        '''(Scanner, list) -> dict
+
+        Return path -> (total size, files with several hard links) for the
+        directory at every path, see measure_directory
+
+        self : the scanner
+        paths : the paths of the directories
+        '''
+
+        sizes = {}
+        if not paths:
+            return sizes
+        pool = self._create_pool()
+        try:
+            for path, total, links, calls in \
+                pool.imap_unordered(measure_directory, paths):
+                self._count(calls)
+                sizes[path] = (total, links)
+        finally:
+            pool.terminate()
+            pool.join()
+        return sizes
+
+    def _set_measures(self, directories, sizes):
+        '''(Scanner, list, dict) -> NoneType
+
+        Set the size of every directory in the list from what
+        _measure_paths gave, see _measure
+
+        self : the scanner
+        directories : list of systemIO.DirectoryInfo
+        sizes : path -> (total size, files with several hard links)
+        '''
+
+        if not directories:
+            return
+        record = systemIO.links_of(directories[0], False)
+        # device and inode of the files already counted
+        seen = set()
+        if record:
+            seen.update(record.sizes)
+        for directory in sorted(directories, key = lambda item: item.path):
+            total, links = sizes[directory.path]
+            for link in links:
+                if link not in seen:
+                    seen.add(link)
+                    total += links[link]
+            directory.size = total
+
+    def expand(self, directory):
+        '''(Scanner, systemIO.DirectoryInfo) -> NoneType
+
+        Read the children of a directory left unread, down to
+        self.lazy_depth levels under it, and update its parents
+
+        self : the scanner
+        directory : the directory
+        '''
+
+        if directory.loaded:
+            return
+        self.syscalls = {}
+        directory.loaded = True
+        self.fill([directory])
+        systemIO.update_parents([directory])
+
+    def refresh(self, root, full = False):
+        '''(Scanner, systemIO.DirectoryInfo[, boolean]) -> list
+
+        Bring a scanned tree up to date by reading again only the
+        directories whose modified time or inode has changed, or every
+        directory if full
+        The children, sizes and links are changed in place
+        Children which are still there are kept, new sub-directories are
+        scanned and the sizes of all the parents are updated
+        Return the list of directories which were read again
+        Without full, directories left unread keep their total size, and a
+        file changing its size without being added, removed or renamed
+        does not change its directory, so it is not seen: this is for the
+        changes followed in the background, a refresh asked by the user is
+        full
+
+        self : the scanner
+        root : the top of the scanned tree
+        full : True to read every directory again and measure again the
+               ones left unread
+        '''
+
+        read = self._read_function()
+        self.syscalls = {}
+        changed = []
+        new_directories = []
+        # the directories left unread, measured again if full
+        unread = []
+        stack = [root]
+        while stack:
+            directory = stack.pop()
+            if not directory.loaded:
+                if full:
+                    unread.append(directory)
+                continue
+            if not full:
+                self._count({"stat": 1})
+                try:
+                    info = os.stat(directory.path)
+                except OSError:
+                    # it is gone, its parent has changed and will drop it
+                    info = None
+                if info and info.st_mtime == directory.mtime and \
+                   info.st_ino == directory.inode:
+                    # nothing added or removed here, look deeper
+                    for child in directory.children:
+                        if child.typ == stdlib.DIRECTORY:
+                            stack.append(child)
+                    continue
+            path, mtime, inode, entries, calls = read(directory.path)
+            self._count(calls)
+            directory.mtime = mtime
+            directory.inode = inode
+            changed.append(directory)
+            stack.extend(self._merge(directory, entries, new_directories))
+        self.fill(new_directories)
+        self._measure(unread)
+        # a directory left unread has no children to add up, its parent
+        # takes its new total
+        measured = [directory.parent for directory in unread \
+                    if directory.parent is not None]
+        record = systemIO.links_of(root, False)
+        if record:
+            # the links which now have the size of a removed link
+            systemIO.update_parents(changed + measured + \
+                                    record.take_changed())
+        else:
+            systemIO.update_parents(changed + measured)
+        return changed
+
+    def _merge(self, directory, entries, new_directories):
+        '''(Scanner, systemIO.DirectoryInfo, list, list) -> list
+
+        Replace the children of the directory by the entries, keeping the
+        children which are still there
+        The children which are gone lose their parent, so they are no longer
+        in the tree, see MainForm._in_tree, and their hard links are counted
+        at another link if there is one
+        New sub-directories are added to new_directories to be scanned
+        Return the list of the old sub-directories which are kept
+
+        self : the scanner
+        directory : the directory being read again
+        entries : list of (path, is directory, size, link)
+        new_directories : list of directories to be scanned
+        '''
+
+        record = systemIO.links_of(directory, False)
+        old_children = {}
+        for child in directory.children:
+            old_children[child.path] = child
+        kept = []
+        directory.children = []
+        for entry in entries:
+            entry_path, is_directory, size, link = entry
+            file_info = old_children.get(entry_path)
+            if file_info and \
+               (file_info.typ == stdlib.DIRECTORY) == is_directory:
+                del old_children[entry_path]
+                if is_directory:
+                    kept.append(file_info)
+                elif link is not None:
+                    systemIO.links_of(directory).add(file_info, link, size)
+                else:
+                    if record:
+                        record.remove(entry_path)
+                    file_info.size = size
+                directory.children.append(file_info)
+            else:
+                new_directories.extend(self._attach(directory, [entry]))
+        for file_info in old_children.values():
+            if record:
+                record.remove_tree(file_info)
+            file_info.parent = None
+        return kept
+
+    def _attach(self, directory, entries, known = None):
+        '''(Scanner, systemIO.DirectoryInfo, list[, dict]) -> list
+
+        Add every entry as a child of the directory
+        Return the list of new sub-directories, which are still empty
+        A sub-directory in known is added as it is, with its children, and
+        is not in the list, its hard links join the record of this tree
+
+        self : the scanner
+        directory : the directory having the entries
+        entries : list of (path, is directory, size, link)
+        known : path -> systemIO.DirectoryInfo of trees already read
+        '''
+
+        if instrument.enabled:
+            instrument.count("scan entries", len(entries))
+        sub_directories = []
+        for entry_path, is_directory, size, link in entries:
+            if is_directory and known and entry_path in known:
+                # read before, it becomes a part of this tree
+                file_info = known[entry_path]
+                file_info.parent = directory
+                directory.children.append(file_info)
+                record = file_info.hard_links
+                if record:
+                    file_info.hard_links = None
+                    systemIO.links_of(directory).add_tree(file_info, record)
+                continue
+            elif is_directory:
+                file_info = systemIO.DirectoryInfo(entry_path, directory, \
+                                                   False)
+                sub_directories.append(file_info)
+            else:
+                file_info = systemIO.FileSystemInfo(entry_path, directory, \
+                                                    stdlib.FILE, size)
+            directory.children.append(file_info)
+            if link is not None:
+                systemIO.links_of(directory).add(file_info, link, size)
+        return sub_directories
+
+
+class ProgressiveScan(object):
+
+    def __init__(self, scanner, path, known = None):
+        '''(ProgressiveScan, Scanner, string[, dict]) -> NoneType
+
+        Start scanning the directory at path in the background
+        The tree in self.root grows every time poll is called, so it can be
+        shown before the scan is done
+        The trees in known are put in the tree as they are instead of being
+        read again
+        Directories deeper than the lazy depth of the scanner are left
+        unread, they are measured once the others are read
+
+        self : the progressive scan
+        scanner : the scanner reading the directories
+        path : the path of the directory
+        known : path -> systemIO.DirectoryInfo of trees under path already
+                read
+        '''
+
+        self.scanner = scanner
+        self.known = known
+        self.root = systemIO.DirectoryInfo(path, None, False)
+        # directories read but not yet filled in, with their level under
+        # the top
+        self.waiting = {path: (self.root, 0)}
+        # directories left unread, waiting for their size
+        self.unread = []
+        # listings read by the background thread, then the sizes of the
+        # directories left unread, None when it is done
+        self.results = Queue.Queue()
+        self.done = False
+        self.stopped = False
+        self.thread = threading.Thread(target = self._produce)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _produce(self):
+        '''(ProgressiveScan) -> NoneType
+
+        Read all the directories and hand them to the form thread, then
+        measure the directories left unread, see Scanner._measure
+
+        self : the progressive scan
+        '''
+
+        # path -> level under the top of the directories to be read
+        levels = {self.root.path: 0}
+        unread = []
+        try:
+            for listing in self.scanner.listings([self.root.path], \
+                                                 self.known):
+                if self.stopped:
+                    break
+                level = levels.pop(listing[0]) + 1
+                for entry_path, is_directory, size, link in listing[3]:
+                    if not is_directory or \
+                       (self.known and entry_path in self.known):
+                        continue
+                    if self.scanner._reads(level):
+                        levels[entry_path] = level
+                    else:
+                        unread.append(entry_path)
+                self.results.put(listing)
+            if unread and not self.stopped:
+                self.results.put(self.scanner._measure_paths(unread))
+        finally:
+            self.results.put(None)
+
+    def stop(self):
+        '''(ProgressiveScan) -> NoneType
+
+        Stop scanning, the tree stays as it is
+
+        self : the progressive scan
+        '''
+
+        self.stopped = True
+
+    def poll(self, budget):
+        '''(ProgressiveScan, float) -> boolean
+
+        Add the directories read so far to the tree, for at most budget
+        seconds, and update the sizes and the order of the children
+        Return True if the tree has changed
+
+        self : the progressive scan
+        budget : the longest time to spend, in seconds
+        '''
+
+        changed = []
+        start = time.time()
+        while not self.done and time.time() - start < budget:
+            try:
+                listing = self.results.get_nowait()
+            except Queue.Empty:
+                break
+            if listing is None:
+                self.done = True
+                break
+            if isinstance(listing, dict):
+                # the sizes of the directories left unread
+                self.scanner._set_measures(self.unread, listing)
+                changed.extend([directory.parent for directory in \
+                                self.unread])
+                self.unread = []
+                continue
+            directory_path, mtime, inode, entries = listing
+            directory, level = self.waiting.pop(directory_path)
+            directory.mtime = mtime
+            directory.inode = inode
+            for sub_directory in self.scanner._attach(directory, entries, \
+                                                      self.known):
+                if self.scanner._reads(level + 1):
+                    self.waiting[sub_directory.path] = (sub_directory, \
+                                                        level + 1)
+                else:
+                    sub_directory.loaded = False
+                    self.unread.append(sub_directory)
+            changed.append(directory)
+        record = self.root.hard_links
+        if record:
+            # links read before which no longer have the size of their file
+            changed.extend(record.take_changed())
+        systemIO.update_parents(changed)
+        return bool(changed)
+
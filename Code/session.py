@@ -0,0 +1,163 @@
+import stdlib
+import systemIO
+import scanner
+import snapshot
+import compact_tree
+import os
+import os.path
+
+
+def inside(path, top):
+    '''(string, string) -> boolean
+
+    Return True if path is top or a path under it
+
+    path : the path
+    top : the path of the top directory
+    '''
+
+    if path == top:
+        return True
+    if not top.endswith(os.sep):
+        top += os.sep
+    return path.startswith(top)
+
+
+class Session(object):
+
+    def __init__(self, folder_scanner = None):
+        '''(Session[, scanner.Scanner]) -> NoneType
+
+        Construct a session keeping the trees of the folders loaded, so
+        loading one of them again, a folder inside one of them or a folder
+        above some of them reads only what was not read yet
+
+        self : the session
+        folder_scanner : the scanner reading the directories, a new one if
+                         None
+        '''
+
+        if folder_scanner is None:
+            folder_scanner = scanner.Scanner()
+        self.scanner = folder_scanner
+        # path -> top of every tree loaded, no tree is inside another one
+        self.trees = stdlib.LRUCache(stdlib.SESSION_TREES)
+
+    def open(self, path):
+        '''(Session, string) -> tuple
+
+        Return (top of the tree, directory at path, scan) for the folder at
+        path, scan being the scanner.ProgressiveScan still filling the tree
+        or None
+        If the folder is inside a tree already loaded, that tree is brought
+        up to date and returned, with the folder shown or, if the tree can
+        not have it (left out, or behind a link or a mount point not
+        followed), the deepest folder above it in the tree, so a tree is
+        never loaded inside another one
+        Otherwise the trees inside the folder are
+        put in the new tree instead of being read again
+        Without such trees the tree is loaded as before: from its snapshot,
+        by a scan of the first levels or by a scan in the background
+
+        self : the session
+        path : the path of the folder
+        '''
+
+        path = os.path.abspath(path)
+        for top in list(self.trees.items):
+            if inside(path, top):
+                root = self.trees.get(top)
+                if isinstance(root, systemIO.DirectoryInfo):
+                    snapshot.refresh_tree(root, self.scanner)
+                return root, self._find(root, path), None
+        # the trees under the folder, brought up to date
+        known = {}
+        for top in list(self.trees.items):
+            if inside(top, path):
+                root = self.trees.items.pop(top)
+                if isinstance(root, systemIO.DirectoryInfo):
+                    snapshot.refresh_tree(root, self.scanner)
+                    known[top] = root
+        progress = None
+        if stdlib.COMPACT_TREE:
+            # a huge folder, it has no snapshot
+            root = compact_tree.scan(self.scanner, path).root()
+        else:
+            root = None
+            if not known:
+                root = snapshot.load_tree(path)
+            if root:
+                snapshot.refresh_tree(root, self.scanner)
+            elif self.scanner.lazy_depth is not None:
+                # only the first levels are read, it is quick enough
+                root = self.scanner.scan(path, known)
+                snapshot.save_tree(root)
+            else:
+                progress = scanner.ProgressiveScan(self.scanner, path, known)
+                root = progress.root
+        self.trees.put(path, root)
+        return root, root, progress
+
+    def _find(self, root, path):
+        '''(Session, systemIO.DirectoryInfo, string) -> systemIO.DirectoryInfo
+
+        Return the directory at path in the tree, or the deepest directory
+        above it which is in the tree if it is not there
+        The directories left unread on the way are read, and a directory
+        not having the next one on the way is read again in case it was
+        made since
+
+        self : the session
+        root : the top of the tree
+        path : the path of the directory, inside the tree
+        '''
+
+        directory = root
+        relative = path[len(root.path):].strip(os.sep)
+        if not relative:
+            return directory
+        for name in relative.split(os.sep):
+            if not directory.loaded:
+                self.scanner.expand(directory)
+                snapshot.save_tree(root)
+            found = self._child(directory, name)
+            if not found and isinstance(directory, systemIO.DirectoryInfo):
+                # the modified time may not have changed yet
+                directory.mtime = None
+                self.scanner.refresh(directory)
+                snapshot.save_tree(root)
+                found = self._child(directory, name)
+            if not found:
+                break
+            directory = found
+        return directory
+
+    def _child(self, directory, name):
+        '''(Session, systemIO.DirectoryInfo, string) -> systemIO.DirectoryInfo
+
+        Return the sub-directory of the directory having the name, None if
+        there is none
+
+        self : the session
+        directory : the directory
+        name : the name of the sub-directory
+        '''
+
+        for child in directory.children:
+            if child.typ == stdlib.DIRECTORY and \
+               os.path.basename(child.path) == name:
+                return child
+        return None
+
+    def forget(self, root):
+        '''(Session, systemIO.DirectoryInfo) -> NoneType
+
+        Drop a tree, the next time its folder is loaded it is read again
+
+        self : the session
+        root : the top of the tree
+        '''
+
+        for top in list(self.trees.items):
+            if self.trees.items[top] is root:
+                del self.trees.items[top]
@@ -0,0 +1,255 @@
+import stdlib
+import systemIO
+import hashlib
+import mmap
+import os
+import os.path
+import struct
+
+# the file starts with the magic string and the version
+HEADER = struct.Struct("<8sI")
+MAGIC = "TREEMAPS"
+VERSION = 5
+# then one record for every file or directory, parents before children:
+# index of the parent directory (-1 for the top), type, size, modified time
+# (-1 for files), inode and device (0 for files) and length of the name,
+# followed by the name itself
+# the type of a directory whose children were not read has UNREAD set
+# the type of a file with several hard links has LINKED set, its record
+# has the whole size of the file, its inode and its device, so the links
+# counted are found again, see systemIO.HardLinks
+RECORD = struct.Struct("<iBqdQQH")
+UNREAD = 0x80
+LINKED = 0x40
+# the settings of stdlib changing the tree read, see snapshot_path
+DEFAULT_SETTINGS = (stdlib.SIZE_APPARENT, False, False, False, ())
+
+
+def snapshot_path(path):
+    '''(string) -> string
+
+    Return the file name of the snapshot of the directory at path
+
+    path : the path of the directory
+    '''
+
+    path = os.path.abspath(path)
+    if isinstance(path, unicode):
+        path = path.encode("utf-8")
+    settings = (stdlib.SIZE_MODE, stdlib.HARD_LINKS_ONCE, \
+                stdlib.FOLLOW_LINKS, stdlib.ONE_FILE_SYSTEM, \
+                tuple(stdlib.EXCLUDE))
+    if settings != DEFAULT_SETTINGS:
+        # the sizes are counted or the folders walked another way, keep
+        # them apart
+        path += "\0" + repr(settings)
+    name = hashlib.md5(path).hexdigest() + ".snap"
+    return os.path.join(stdlib.SNAPSHOT_DIRECTORY, name)
+
+
+def save(root, filename):
+    '''(systemIO.DirectoryInfo, string) -> NoneType
+
+    Write the scanned tree into the snapshot file
+    The file is replaced only when it is completely written
+
+    root : the top of the tree
+    filename : the name of the snapshot file
+    '''
+
+    folder = os.path.dirname(filename)
+    if folder and not os.path.isdir(folder):
+        os.makedirs(folder)
+    # a file of its own, so processes saving the same folder do not write
+    # into each other's file
+    temporary = "%s.%d.tmp" % (filename, os.getpid())
+    record = systemIO.links_of(root, False)
+    snapshot = open(temporary, "wb")
+    try:
+        snapshot.write(HEADER.pack(MAGIC, VERSION))
+        directory_count = 0
+        stack = [(root, -1)]
+        while stack:
+            file_info, parent = stack.pop()
+            if parent < 0:
+                name = file_info.path
+            else:
+                name = os.path.basename(file_info.path)
+            if isinstance(name, unicode):
+                name = name.encode("utf-8")
+            typ = file_info.typ
+            size = file_info.size
+            mtime = -1
+            inode = 0
+            device = 0
+            if typ == stdlib.DIRECTORY and not file_info.loaded:
+                typ |= UNREAD
+            if file_info.typ == stdlib.DIRECTORY and \
+               file_info.mtime is not None:
+                mtime = file_info.mtime
+                inode = file_info.inode
+            key = record and record.key_of(file_info.path)
+            if file_info.typ == stdlib.FILE and key is not None:
+                typ |= LINKED
+                size = record.sizes[key]
+                device = key >> 64
+                inode = key & 0xFFFFFFFFFFFFFFFF
+            snapshot.write(RECORD.pack(parent, typ, size, mtime, inode, \
+                                       device, len(name)))
+            snapshot.write(name)
+            if file_info.typ == stdlib.DIRECTORY:
+                # push backward so the children come out in order
+                for child in reversed(file_info.children):
+                    stack.append((child, directory_count))
+                directory_count += 1
+    finally:
+        snapshot.close()
+    if os.path.exists(filename):
+        # windows does not replace a file when renaming
+        os.remove(filename)
+    os.rename(temporary, filename)
+
+
+def load(filename):
+    '''(string) -> systemIO.DirectoryInfo
+
+    Return the tree stored in the snapshot file
+    Raise ValueError if the file is not a snapshot
+
+    filename : the name of the snapshot file
+    '''
+
+    snapshot = open(filename, "rb")
+    try:
+        data = mmap.mmap(snapshot.fileno(), 0, access = mmap.ACCESS_READ)
+    finally:
+        snapshot.close()
+    directories = []
+    # (file, device and inode, size) of the files with several hard links
+    links = []
+    try:
+        magic, version = HEADER.unpack_from(data, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("not a treemap snapshot: " + filename)
+        offset = HEADER.size
+        end = len(data)
+        while offset < end:
+            parent, typ, size, mtime, inode, device, length = \
+                    RECORD.unpack_from(data, offset)
+            offset += RECORD.size
+            name = data[offset:offset + length]
+            offset += length
+            if parent < 0:
+                parent_info = None
+                path = name
+            else:
+                parent_info = directories[parent]
+                path = os.path.join(parent_info.path, name)
+            if typ & ~UNREAD == stdlib.DIRECTORY:
+                file_info = systemIO.DirectoryInfo(path, parent_info, False)
+                file_info.size = size
+                file_info.loaded = not typ & UNREAD
+                if mtime >= 0:
+                    file_info.mtime = mtime
+                    file_info.inode = inode
+                directories.append(file_info)
+            elif typ & LINKED:
+                file_info = systemIO.FileSystemInfo(path, parent_info, \
+                                                    stdlib.FILE, 0)
+                links.append((file_info, (device << 64) | inode, size))
+            else:
+                file_info = systemIO.FileSystemInfo(path, parent_info, \
+                                                    stdlib.FILE, size)
+            if parent_info:
+                parent_info.children.append(file_info)
+    finally:
+        data.close()
+    if not directories:
+        raise ValueError("empty treemap snapshot: " + filename)
+    if links:
+        record = systemIO.links_of(directories[0])
+        for file_info, key, size in links:
+            record.add(file_info, key, size)
+        # the sizes of the directories were saved with the links counted
+        record.take_changed()
+    # the children were saved in order, they only need to be connected
+    for directory in directories:
+        directory.connect_children()
+    return directories[0]
+
+
+def open_tree(path, scanner):
+    '''(string, scanner.Scanner) -> systemIO.DirectoryInfo
+
+    Return the tree of the directory at path
+    Load it from its snapshot if there is one and only read again the
+    directories which have changed, otherwise scan it
+    The snapshot is then saved for the next time
+    The tree has the absolute path, so a relative path or a path ending
+    with a separator finds the same snapshot as the form does
+
+    path : the path of the directory
+    scanner : the scanner reading the directories
+    '''
+
+    path = os.path.abspath(path)
+    root = load_tree(path)
+    if root:
+        refresh_tree(root, scanner)
+    else:
+        root = scanner.scan(path)
+        save_tree(root)
+    return root
+
+
+def load_tree(path):
+    '''(string) -> systemIO.DirectoryInfo
+
+    Return the tree of the directory at path as it is in its snapshot, or
+    None if there is no snapshot of it which can be read
+
+    path : the path of the directory
+    '''
+
+    path = os.path.abspath(path)
+    try:
+        root = load(snapshot_path(path))
+    except (IOError, OSError, ValueError, IndexError, struct.error):
+        # no snapshot or a broken one
+        return None
+    if root.path != path:
+        return None
+    return root
+
+
+def refresh_tree(root, scanner, full = False):
+    '''(systemIO.DirectoryInfo, scanner.Scanner[, boolean]) -> list
+
+    Read again the directories of the tree which have changed, or all of
+    them if full, and save its snapshot if anything has changed
+    Return the list of directories which were read again
+
+    root : the top of the tree
+    scanner : the scanner reading the directories
+    full : True to read every directory again, see Scanner.refresh
+    '''
+
+    changed = scanner.refresh(root, full)
+    if changed:
+        save_tree(root)
+    return changed
+
+
+def save_tree(root):
+    '''(systemIO.DirectoryInfo) -> NoneType
+
+    Save the snapshot of the tree, if it can not be written the next start
+    will scan again
+
+    root : the top of the tree
+    '''
+
+    try:
+        save(root, snapshot_path(root.path))
+    except (IOError, OSError):
+        pass
@@ -1,4 +1,6 @@
 import pygame
+import collections
+import os.path
 
 
 class Point(object):
@@ -33,6 +35,107 @@ class Point(object):
                and (self.y <= position.y + size.y)
 
 
+def parse_size(text):
+    '''(string) -> Point
+
+    Return the size written as WIDTHxHEIGHT
+    Raise ValueError if it is not a size
+
+    text : the size
+    '''
+
+    width, height = text.lower().split("x")
+    size = Point(int(width), int(height))
+    if size.x <= 0 or size.y <= 0:
+        raise ValueError("empty size: " + text)
+    return size
+
+
+class LRUCache(object):
+
+    def __init__(self, capacity):
+        '''(LRUCache, int) -> NoneType
+
+        Construct an empty cache keeping at most capacity items, the ones
+        used the longest time ago are dropped first
+
+        self : the cache
+        capacity : the largest number of items
+        '''
+
+        self.capacity = capacity
+        self.items = collections.OrderedDict()
+        # how many times an item was found or not
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default = None):
+        '''(LRUCache, object[, object]) -> object
+
+        Return the item of the key, default if there is none
+
+        self : the cache
+        key : the key
+        default : what to return if the key is not there
+        '''
+
+        try:
+            value = self.items.pop(key)
+        except KeyError:
+            self.misses += 1
+            return default
+        # it is now the last used
+        self.items[key] = value
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        '''(LRUCache, object, object) -> NoneType
+
+        Keep the item of the key, dropping the oldest one if it is full
+
+        self : the cache
+        key : the key
+        value : the item
+        '''
+
+        self.items.pop(key, None)
+        self.items[key] = value
+        while len(self.items) > self.capacity:
+            self.items.popitem(False)
+
+    def clear(self):
+        '''(LRUCache) -> NoneType
+
+        Drop all the items
+
+        self : the cache
+        '''
+
+        self.items.clear()
+
+    def __len__(self):
+        '''(LRUCache) -> int
+
+        Return the number of items
+
+        self : the cache
+        '''
+
+        return len(self.items)
+
+    def __contains__(self, key):
+        '''(LRUCache, object) -> boolean
+
+        Return True if the key has an item, without making it the last used
+
+        self : the cache
+        key : the key
+        '''
+
+        return key in self.items
+
+
 # all the constants
 
 # button size
@@ -53,8 +156,91 @@ MOUSE_EVENT = [pygame.MOUSEBUTTONDOWN, \
 FILE = 3
 DIRECTORY = 4
 SECTION = 5
+# scanning
+SCAN_WORKERS = 8
+SCAN_USE_PROCESS = False
+SCAN_LISTDIR = 0
+SCAN_SCANDIR = 1
+SCAN_MODE = SCAN_SCANDIR
+# how many levels of directories are read at first, the deeper ones are read
+# when they are opened, None to read everything
+LAZY_DEPTH = None
+# keep the files in arrays instead of objects, for huge folders
+COMPACT_TREE = False
+# while scanning in the background, the longest time spent adding what was
+# read to the tree every loop and the shortest time between two layouts,
+# in seconds
+PROGRESS_BUDGET = 0.02
+PROGRESS_INTERVAL = 0.25
+# how the map is cut: "binary", "squarified" or "slice"
+LAYOUT = "binary"
+# the squarified layout first cuts in half lists longer than this, so the
+# map does not get too deep
+SQUARIFY_LIMIT = 1000
+# a file longer than this many times its width is too thin to read
+SLIVER_RATIO = 10
+# a unit of the map smaller than this many pixels is not split, its files
+# are shown together as one
+MIN_UNIT_AREA = 4
+# the size in pixels of the cells of the index finding the file under the
+# mouse
+INDEX_CELL = 16
+# the font of the text of the controls, and the number of rendered texts
+# kept so the same text is not drawn again
+FONT_NAME = None
+FONT_SIZE = 20
+TEXT_CACHE_SIZE = 256
+# the window is woken up every IDLE_INTERVAL milliseconds to do its own work
+# by the IDLE_EVENT event, it never draws more than FRAME_RATE frames a
+# second, and it prints how busy it is every FRAME_REPORT milliseconds, 0 to
+# never print it
+IDLE_EVENT = pygame.USEREVENT
+IDLE_INTERVAL = 100
+FRAME_RATE = 60
+FRAME_REPORT = 0
+# record how often the hot parts run and how long they take, see
+# instrument.py, the environment variable TREEMAP_INSTRUMENT also turns it
+# on; the numbers are shown over the form if INSTRUMENT_OVERLAY and written
+# to INSTRUMENT_FILE when the form is closed
+INSTRUMENT = False
+INSTRUMENT_OVERLAY = True
+INSTRUMENT_FILE = "treemap-stats.json"
+# watch the shown folder for changes, every WATCH_INTERVAL milliseconds
+WATCH_FOLDER = True
+WATCH_INTERVAL = 200
+# when the system has no watches left, the folders which could not be
+# watched are checked for changes every WATCH_REFRESH_INTERVAL milliseconds
+WATCH_REFRESH_INTERVAL = 5000
+# how the size of a file is counted: SIZE_APPARENT is its length,
+# SIZE_ALLOCATED the room its blocks take on the disk, what du shows
+SIZE_APPARENT = 0
+SIZE_ALLOCATED = 1
+SIZE_MODE = SIZE_APPARENT
+# count a file with several hard links at one of its links only, the one
+# of smallest path in the tree, the others are shown with size 0
+HARD_LINKS_ONCE = False
+# how folders are walked: links to folders are followed only if
+# FOLLOW_LINKS, and never a link to a folder above it, so a loop of links
+# ends; with ONE_FILE_SYSTEM the folders mounted inside the folder loaded
+# are not read; files and folders whose name matches one of the patterns of
+# EXCLUDE, such as ".git" or "node_modules", are left out without being read
+FOLLOW_LINKS = False
+ONE_FILE_SYSTEM = False
+EXCLUDE = []
+# the number of trees of folders loaded before which are kept, so loading
+# them again, or a folder inside or above them, does not read them again
+SESSION_TREES = 4
+# the number of maps of folders shown before which are kept, so going back
+# to them does not lay them out and draw them again
+ZOOM_CACHE_SIZE = 8
+# where the snapshots of scanned folders are kept
+SNAPSHOT_DIRECTORY = os.path.join(os.path.expanduser("~"), ".treemap")
 # key value
 UP = [273, 8, 119]
 DOWN = [274, 13, 115]
 LEFT = [276, 97]
 RIGHT = [275, 100]
+# z, = and + of the keypad show the selected folder on the whole map, x, -
+# and - of the keypad go back to the folder above
+ZOOM_IN = [122, 61, 270]
+ZOOM_OUT = [120, 45, 269]
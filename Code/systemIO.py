@@ -1,12 +1,15 @@
 import stdlib
+import instrument
+import fnmatch
 import os
 import os.path
+import stat
 
 
 class FileSystemInfo(object):
 
-    def __init__(self, path, parent = None, typ = stdlib.FILE):
-        '''(FileSystemInfo, string[, FileSystemInfo, int]) -> NoneType
+    def __init__(self, path, parent = None, typ = stdlib.FILE, size = None):
+        '''(FileSystemInfo, string[, FileSystemInfo, int, int]) -> NoneType
 
         Construct a file inforamtion from given path
 
@@ -14,6 +17,7 @@ class FileSystemInfo(object):
         path : the path of the file
         parent : parent of the file
         typ : indicating whether it is a directory or a file
+        size : the size of the file if it is already known
         '''
 
         self.display_unit = None
@@ -23,7 +27,9 @@ class FileSystemInfo(object):
         self.previous = None
         self.typ = typ
         if typ == stdlib.FILE:
-            self.size = os.path.getsize(path)
+            if size is None:
+                size = file_size(os.stat(path))
+            self.size = size
 
     def __cmp__(self, other):
         '''(FileSystemInfo, FileSystemInfo) -> int
@@ -45,33 +51,118 @@ class FileSystemInfo(object):
             return 0
 
 
+class AggregateInfo(FileSystemInfo):
+
+    def __init__(self, parent, count, size):
+        '''(AggregateInfo, DirectoryInfo, int, int) -> NoneType
+
+        Construct the information of files too small to be shown one by one,
+        they are shown together as one file
+
+        self : the files
+        parent : the directory of the files
+        count : the number of files
+        size : the total size of the files
+        '''
+
+        FileSystemInfo.__init__(self, os.path.join(parent.path, \
+                                "(%d small files)" % count), \
+                                parent, stdlib.FILE, size)
+        self.count = count
+
+
 class DirectoryInfo(FileSystemInfo):
 
-    def __init__(self, path, parent = None):
-        '''(DirectoryInfo, string, DirectoryInfo) -> NoneType
+    @instrument.timed("directories")
+    def __init__(self, path, parent = None, recursive = True):
+        '''(DirectoryInfo, string[, DirectoryInfo, boolean]) -> NoneType
 
         Construct a directory inforamtion from given path
+        If recursive is False, the directory is left empty so that a scanner
+        can fill in its children later
 
         self : the folder
         path : the path of the folder
         parent : parent of the folder
+        recursive : if all the children should be read now
         '''
 
         FileSystemInfo.__init__(self, path, parent, stdlib.DIRECTORY)
         self.children = []
         self.size = 0
+        # modified time and inode when the children were read
+        self.mtime = None
+        self.inode = None
+        # False if only the total size is known, not the children
+        self.loaded = True
+        # the links of the files with several hard links, only at the top
+        # of a tree, see links_of
+        self.hard_links = None
+        if not recursive:
+            return
+        # the sub-directories wait on a stack instead of being read by
+        # their own constructor, so a deep tree does not reach the limit of
+        # recursion
+        directories = [self]
+        stack = [self]
+        while stack:
+            directory = stack.pop()
+            directory._read()
+            for child in directory.children:
+                if child.typ == stdlib.DIRECTORY:
+                    directories.append(child)
+                    stack.append(child)
+        # the sizes go up from the deepest directories
+        for directory in reversed(directories):
+            directory.update()
+        if parent is None and self.hard_links is not None:
+            # the sizes just computed already count every link
+            self.hard_links.take_changed()
+
+    def _read(self):
+        '''(DirectoryInfo) -> NoneType
+
+        Read the children of the directory, its sub-directories are left
+        empty
+
+        self : the folder
+        '''
+
+        info = os.stat(self.path)
+        self.mtime = info.st_mtime
+        self.inode = info.st_ino
         # get all children
-        for filename in os.listdir(path):
-            subitem = os.path.join(path, filename)
+        for filename in os.listdir(self.path):
+            if excluded(filename):
+                continue
+            subitem = os.path.join(self.path, filename)
             file_info = None
-            if os.path.isdir(subitem):
-                # get all the sub-directory
-                file_info = DirectoryInfo(subitem, self)
+            is_directory, size, link = read_entry(subitem, info.st_dev)
+            if is_directory:
+                # get the sub-directory, it is read later
+                file_info = DirectoryInfo(subitem, self, False)
             else:
                 # get all the files
-                file_info = FileSystemInfo(subitem, self)
-            self.size += file_info.size
+                file_info = FileSystemInfo(subitem, self, stdlib.FILE, size)
             self.children.append(file_info)
+            if link is not None:
+                links_of(self).add(file_info, link, size)
+        if instrument.enabled:
+            instrument.count("scan entries", len(self.children))
+
+    def update(self):
+        '''(DirectoryInfo) -> NoneType
+
+        Recompute the size of the directory from its children, then put all
+        the children in order and connect them
+        Precondition : the size of every child is up to date
+
+        self : the folder
+        '''
+
+        self.size = 0
+        for child in self.children:
+            self.size += child.size
         # put all the children in order and connect them
         self.children.sort()
         self.connect_children()
@@ -96,3 +187,358 @@ class DirectoryInfo(FileSystemInfo):
             # connect n-1 and 0
             self.children[len(self.children) - 1].next = self.children[0]
             self.children[0].previous = self.children[len(self.children) - 1]
+        elif self.children:
+            # a single child may still be linked to removed children
+            self.children[0].next = None
+            self.children[0].previous = None
+
+
+class HardLinks(object):
+
+    def __init__(self):
+        '''(HardLinks) -> NoneType
+
+        Construct an empty record of the files of a tree having several hard
+        links, so every such file is counted at one of its links only
+        The link counted is the one of smallest path, whatever order the
+        links are read in, and when it is taken out of the tree another link
+        of the file takes its size
+        The record is kept by the top of the tree, see links_of
+
+        self : the record
+        '''
+
+        # device and inode -> {path: file} of the links in the tree
+        self.links = {}
+        # device and inode -> size of the file
+        self.sizes = {}
+        # device and inode -> path of the link counted
+        self.counted = {}
+        # path -> device and inode, for every link in the tree
+        self.keys = {}
+        # the directories of the links whose size was changed, see
+        # take_changed
+        self.changed = []
+
+    def _set_size(self, file_info, size):
+        '''(HardLinks, FileSystemInfo, int) -> NoneType
+
+        Give the size to a link, and remember its directory if it changed
+
+        self : the record
+        file_info : the link
+        size : its size
+        '''
+
+        if file_info.size != size:
+            file_info.size = size
+            if file_info.parent is not None:
+                self.changed.append(file_info.parent)
+
+    def _count(self, key):
+        '''(HardLinks, int) -> NoneType
+
+        Give the size of the file to its link of smallest path, and 0 to
+        its other links
+
+        self : the record
+        key : the device and inode of the file
+        '''
+
+        links = self.links[key]
+        counted = min(links)
+        old = self.counted.get(key)
+        if old is not None and old != counted and old in links:
+            self._set_size(links[old], 0)
+        self.counted[key] = counted
+        self._set_size(links[counted], self.sizes[key])
+
+    def add(self, file_info, key, size):
+        '''(HardLinks, FileSystemInfo, int, int) -> NoneType
+
+        Add a link of a file to the tree, or give a link already there the
+        new size of its file
+
+        self : the record
+        file_info : the link
+        key : the device and inode of the file, see link_key
+        size : the size of the file
+        '''
+
+        path = file_info.path
+        old_key = self.keys.get(path)
+        if old_key is not None and old_key != key:
+            # another file now has this path
+            self.remove(path)
+        self.keys[path] = key
+        self.sizes[key] = size
+        self.links.setdefault(key, {})[path] = file_info
+        if self.counted.get(key) != path:
+            self._set_size(file_info, 0)
+        self._count(key)
+
+    def remove(self, path):
+        '''(HardLinks, string) -> NoneType
+
+        Take the link at path out of the record, if it is the link counted
+        another link of the file is counted instead
+
+        self : the record
+        path : the path of the link
+        '''
+
+        key = self.keys.pop(path, None)
+        if key is None:
+            return
+        links = self.links[key]
+        del links[path]
+        if not links:
+            del self.links[key]
+            del self.sizes[key]
+            del self.counted[key]
+        elif self.counted[key] == path:
+            del self.counted[key]
+            self._count(key)
+
+    def remove_tree(self, top):
+        '''(HardLinks, FileSystemInfo) -> NoneType
+
+        Take every link under top, top included, out of the record
+
+        self : the record
+        top : the file or directory taken out of the tree
+        '''
+
+        if not self.keys:
+            return
+        stack = [top]
+        while stack:
+            file_info = stack.pop()
+            if file_info.typ == stdlib.DIRECTORY:
+                stack.extend(file_info.children)
+            else:
+                self.remove(file_info.path)
+
+    def add_tree(self, top, record):
+        '''(HardLinks, FileSystemInfo, HardLinks) -> NoneType
+
+        Add the links of another record found under top, when the tree of
+        that record becomes a part of this one, or when it was moved and
+        its paths have changed
+
+        self : the record
+        top : the top of the sub-tree
+        record : the record having the links of the sub-tree, by their old
+                 paths
+        '''
+
+        if not record.keys:
+            return
+        moved = []
+        stack = [(top, top.path)]
+        while stack:
+            file_info, old_path = stack.pop()
+            if file_info.typ == stdlib.DIRECTORY:
+                for child in file_info.children:
+                    stack.append((child, os.path.join(old_path, \
+                                  os.path.basename(child.path))))
+            elif old_path in record.keys:
+                moved.append((file_info, record.keys[old_path]))
+        for file_info, key in moved:
+            self.add(file_info, key, record.sizes[key])
+
+    def key_of(self, path):
+        '''(HardLinks, string) -> int
+
+        Return the device and inode of the link at path, None if it is not a
+        link of a file having several
+
+        self : the record
+        path : the path of the link
+        '''
+
+        return self.keys.get(path)
+
+    def take_changed(self):
+        '''(HardLinks) -> list
+
+        Return the directories whose size has to be updated because the
+        size of one of their links changed, and forget them
+
+        self : the record
+        '''
+
+        changed = self.changed
+        self.changed = []
+        return changed
+
+
+def links_of(file_info, create = True):
+    '''(FileSystemInfo[, boolean]) -> HardLinks
+
+    Return the record of the links of the tree of the file, kept by the top
+    of the tree, it is made the first time it is needed
+    Return None if the tree has no record yet and create is False
+
+    file_info : a file or directory of the tree
+    create : make the record if there is none
+    '''
+
+    top = file_info
+    while top.parent is not None:
+        top = top.parent
+    if top.hard_links is None and create:
+        top.hard_links = HardLinks()
+    return top.hard_links
+
+
+def link_key(info):
+    '''(posix.stat_result) -> int
+
+    Return the device and inode of a file as one number if it has several
+    hard links and stdlib.HARD_LINKS_ONCE, None otherwise
+
+    info : what os.stat gave for the file
+    '''
+
+    if stdlib.HARD_LINKS_ONCE and info.st_nlink > 1 and \
+       not stat.S_ISDIR(info.st_mode):
+        return (info.st_dev << 64) | info.st_ino
+    return None
+
+
+def file_size(info):
+    '''(posix.stat_result) -> int
+
+    Return the size of the file as it is shown on the map
+    It is the length of the file, or the room it takes on the disk if
+    stdlib.SIZE_MODE is SIZE_ALLOCATED, which is less for a sparse file
+    A file with several hard links has its whole size here, see HardLinks
+
+    info : what os.stat gave for the file
+    '''
+
+    if stdlib.SIZE_MODE == stdlib.SIZE_ALLOCATED and \
+       hasattr(info, "st_blocks"):
+        return info.st_blocks * 512
+    return info.st_size
+
+
+def excluded(name):
+    '''(string) -> boolean
+
+    Return True if the file or directory of this name is left out of the
+    tree, see stdlib.EXCLUDE
+    A directory left out is not read at all
+
+    name : the name of the file or directory, without its directory
+    '''
+
+    for pattern in stdlib.EXCLUDE:
+        if fnmatch.fnmatch(name, pattern):
+            return True
+    return False
+
+
+def count_call(calls, name):
+    '''(dict, string) -> NoneType
+
+    Count one system call of the kind name in calls, if calls is not None
+
+    calls : kind of call -> number of calls
+    name : the kind of call
+    '''
+
+    if calls is not None:
+        calls[name] = calls.get(name, 0) + 1
+
+
+def is_loop(path, calls = None):
+    '''(string[, dict]) -> boolean
+
+    Return True if the link at path leads to a directory above it, reading
+    it would never end
+    Every realpath is counted in calls, it makes an lstat for each part of
+    the path
+
+    path : the path of the link
+    calls : kind of call -> number of calls, None to count nothing
+    '''
+
+    count_call(calls, "realpath")
+    target = os.path.realpath(path)
+    parent = os.path.dirname(os.path.abspath(path))
+    while True:
+        # the directories above may be links too, compare where they lead
+        count_call(calls, "realpath")
+        if os.path.realpath(parent) == target:
+            return True
+        above = os.path.dirname(parent)
+        if above == parent:
+            return False
+        parent = above
+
+
+def read_entry(path, device, calls = None):
+    '''(string, int[, dict]) -> tuple
+
+    Return (is directory, size, link) of the entry at path of a directory,
+    the size of a directory being 0 and link the device and inode of a file
+    with several hard links, see link_key, None for other entries
+    A link is followed only if stdlib.FOLLOW_LINKS and it does not lead to
+    a directory above it, otherwise it is shown as a file of its own size
+    If stdlib.ONE_FILE_SYSTEM, a directory on another device than its
+    directory is a mount point and is shown as an empty file
+    Raise OSError if the entry can not be read
+
+    path : the path of the entry
+    device : the device of the directory of the entry
+    calls : kind of call -> number of calls, the calls made are added to it
+            if it is not None
+    '''
+
+    count_call(calls, "lstat")
+    info = os.lstat(path)
+    if stat.S_ISLNK(info.st_mode) and stdlib.FOLLOW_LINKS:
+        count_call(calls, "stat")
+        try:
+            target = os.stat(path)
+        except OSError:
+            # a broken link
+            target = None
+        if target and \
+           not (stat.S_ISDIR(target.st_mode) and is_loop(path, calls)):
+            info = target
+    if stat.S_ISDIR(info.st_mode):
+        if stdlib.ONE_FILE_SYSTEM and info.st_dev != device:
+            return False, 0, None
+        return True, 0, None
+    return False, file_size(info), link_key(info)
+
+
+def update_parents(directories):
+    '''(list) -> NoneType
+
+    Update the size and the order of the children of every directory in the
+    list and of all their parents, deepest directories first
+
+    directories : list of DirectoryInfo
+    '''
+
+    # id of the directory -> (depth, directory)
+    depths = {}
+    for directory in directories:
+        depth = 0
+        parents = []
+        while directory and id(directory) not in depths:
+            parents.append(directory)
+            directory = directory.parent
+        if directory:
+            depth = depths[id(directory)][0] + 1
+        for parent in reversed(parents):
+            depths[id(parent)] = (depth, parent)
+            depth += 1
+    for depth, directory in sorted(depths.values(), \
+                                   key = lambda item: item[0], \
+                                   reverse = True):
+        directory.update()
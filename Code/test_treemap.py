@@ -0,0 +1,296 @@
+import stdlib
+import systemIO
+import scanner
+import snapshot
+import layout
+import export
+import compact_tree
+import benchmark
+import display_unit
+import os
+import os.path
+import random
+import shutil
+import StringIO
+import tempfile
+try:
+    import vector_layout
+except ImportError:
+    # numpy is not installed
+    vector_layout = None
+# run with: python test_treemap.py
+#       or: python -m pytest test_treemap.py
+
+
+def original_partition(file_list):
+    '''(list) -> int, float, int
+
+    Return (index, percent, total) as the first display_unit cut a sorted
+    list of files, before the layouts were added: the files before index
+    take percent of the total
+
+    file_list : the files, biggest first
+    '''
+
+    total = 0
+    for file_info in file_list:
+        total += file_info.size
+    if total == 0:
+        return 0, 0, 0
+    s = 0
+    for i in range(0, len(file_list)):
+        s += file_list[i].size
+        if s * 2 > total:
+            break
+    s -= file_list[i].size
+    return i, float(s) / float(total), total
+
+
+def make_files(sizes):
+    '''(list) -> list
+
+    Return files living only in memory with the sizes, biggest first
+
+    sizes : the sizes
+    '''
+
+    return [systemIO.FileSystemInfo("f" + str(i), None, stdlib.FILE, size) \
+            for i, size in enumerate(sorted(sizes, reverse = True))]
+
+
+def tree_of(root):
+    '''(systemIO.DirectoryInfo) -> dict
+
+    Return path -> (type, size, loaded) of every file and directory of the
+    tree, to compare two trees
+
+    root : the top of the tree
+    '''
+
+    result = {}
+    stack = [root]
+    while stack:
+        file_info = stack.pop()
+        loaded = getattr(file_info, "loaded", True)
+        result[file_info.path] = (file_info.typ, file_info.size, loaded)
+        if file_info.typ == stdlib.DIRECTORY:
+            stack.extend(file_info.children)
+    return result
+
+
+def write_file(path, size):
+    '''(string, int) -> NoneType
+
+    Write a file of size bytes at path
+
+    path : the path of the file
+    size : its size
+    '''
+
+    new_file = open(path, "wb")
+    new_file.write("x" * size)
+    new_file.close()
+
+
+def make_folder(top):
+    '''(string) -> NoneType
+
+    Write a small tree of files and directories under top
+
+    top : the path of the top directory, which must exist
+    '''
+
+    for name in ["a", "b", os.path.join("b", "c")]:
+        os.mkdir(os.path.join(top, name))
+    write_file(os.path.join(top, "f"), 10)
+    write_file(os.path.join(top, "a", "g"), 200)
+    write_file(os.path.join(top, "b", "h"), 3000)
+    write_file(os.path.join(top, "b", "c", "i"), 40)
+
+
+def test_binary_layout():
+    '''() -> NoneType
+
+    BinaryLayout cuts a list where the first display_unit did
+    '''
+
+    random.seed(1)
+    binary = layout.BinaryLayout()
+    for count in [1, 2, 3, 5, 10, 100]:
+        for distribution in ["uniform", "skewed"]:
+            file_list = make_files([benchmark.random_size(distribution) \
+                                    for i in range(0, count)])
+            prefix = [0]
+            for file_info in file_list:
+                prefix.append(prefix[-1] + file_info.size)
+            index, percent = binary.split(prefix, 0, count, \
+                                          stdlib.Point(100, 50), 0, None)[:2]
+            assert (index, percent) == original_partition(file_list)[:2]
+    # equal sizes, and a list cut where a half ends exactly
+    for sizes in [[5, 5, 5, 5], [3, 2, 1], [1, 1], [7, 1, 1, 1, 1, 1, 1, 1]]:
+        file_list = make_files(sizes)
+        prefix = [0]
+        for file_info in file_list:
+            prefix.append(prefix[-1] + file_info.size)
+        index, percent = binary.split(prefix, 0, len(sizes), \
+                                      stdlib.Point(10, 10), 0, None)[:2]
+        assert (index, percent) == original_partition(file_list)[:2]
+
+
+def test_snapshot_round_trip():
+    '''() -> NoneType
+
+    A tree saved in a snapshot is loaded back the same, hard links too
+    '''
+
+    top = tempfile.mkdtemp()
+    stdlib.HARD_LINKS_ONCE = True
+    try:
+        make_folder(top)
+        os.link(os.path.join(top, "b", "h"), os.path.join(top, "a", "h"))
+        root = scanner.Scanner(lazy_depth = None).scan(top)
+        filename = os.path.join(top, "tree.snap")
+        snapshot.save(root, filename)
+        loaded = snapshot.load(filename)
+        assert tree_of(loaded) == tree_of(root)
+        assert systemIO.links_of(loaded, False).counted == \
+               systemIO.links_of(root, False).counted
+        # a file which is not a snapshot
+        write_file(filename, 100)
+        try:
+            snapshot.load(filename)
+        except ValueError:
+            pass
+        else:
+            assert False, "a broken snapshot was loaded"
+    finally:
+        stdlib.HARD_LINKS_ONCE = False
+        shutil.rmtree(top)
+
+
+def test_refresh():
+    '''() -> NoneType
+
+    Refreshing a tree gives the tree a new scan gives, and a full refresh
+    also sees a file whose size changed in place
+    '''
+
+    top = tempfile.mkdtemp()
+    try:
+        make_folder(top)
+        reader = scanner.Scanner(lazy_depth = None)
+        root = reader.scan(top)
+        write_file(os.path.join(top, "a", "new"), 500)
+        os.remove(os.path.join(top, "f"))
+        os.mkdir(os.path.join(top, "d"))
+        write_file(os.path.join(top, "d", "j"), 60)
+        shutil.rmtree(os.path.join(top, "b", "c"))
+        # the modified times of the directories may not change within the
+        # same second
+        for path in [top, os.path.join(top, "a"), os.path.join(top, "b")]:
+            os.utime(path, (0, 0))
+        assert reader.refresh(root)
+        assert tree_of(root) == tree_of(reader.scan(top))
+        # the same size for the directory, only the file grew
+        write_file(os.path.join(top, "a", "g"), 700)
+        reader.refresh(root, True)
+        assert tree_of(root) == tree_of(reader.scan(top))
+        # directories below the lazy depth only get their total
+        lazy = scanner.Scanner(lazy_depth = 1)
+        root = lazy.scan(top)
+        write_file(os.path.join(top, "b", "more"), 5)
+        lazy.refresh(root, True)
+        assert tree_of(root) == tree_of(lazy.scan(top))
+    finally:
+        shutil.rmtree(top)
+
+
+def test_hard_links():
+    '''() -> NoneType
+
+    A file with several hard links is counted once, at its link of
+    smallest path, and its size goes to another link when that one is
+    removed
+    '''
+
+    top = tempfile.mkdtemp()
+    stdlib.HARD_LINKS_ONCE = True
+    try:
+        make_folder(top)
+        first = os.path.join(top, "a", "h")
+        os.link(os.path.join(top, "b", "h"), first)
+        reader = scanner.Scanner(lazy_depth = None)
+        for root in [reader.scan(top), systemIO.DirectoryInfo(top)]:
+            sizes = tree_of(root)
+            assert root.size == 10 + 200 + 3000 + 40
+            assert sizes[first][1] == 3000
+            assert sizes[os.path.join(top, "b", "h")][1] == 0
+        root = reader.scan(top)
+        os.remove(first)
+        os.utime(os.path.join(top, "a"), (0, 0))
+        reader.refresh(root)
+        sizes = tree_of(root)
+        assert root.size == 10 + 200 + 3000 + 40
+        assert sizes[os.path.join(top, "b", "h")][1] == 3000
+        assert sizes[os.path.join(top, "b")][1] == 3040
+    finally:
+        stdlib.HARD_LINKS_ONCE = False
+        shutil.rmtree(top)
+
+
+def test_vector_layout():
+    '''() -> NoneType
+
+    vector_layout gives every file the rectangle display_unit gives it
+    '''
+
+    if vector_layout is None:
+        # numpy is not installed
+        return
+    random.seed(2)
+    root = benchmark.make_tree(3, 2, 4, "skewed")[0]
+    position = stdlib.Point(10, 10)
+    size = stdlib.Point(1004, 510)
+    tree = compact_tree.from_directory(root)
+    rects = vector_layout.layout(tree, position, size)
+    vector = {}
+    for rect in rects[1:]:
+        vector[tree.path_of(rect["node_id"])] = \
+            (rect["x"], rect["y"], rect["w"], rect["h"])
+    unit = display_unit.DisplayUnit(position, size, None, [root])
+    stack = [unit]
+    while stack:
+        unit = stack.pop()
+        # files too small to be split are put together by display_unit
+        # only
+        if unit.left is None and unit.right is None and \
+           unit.file_system_info is not None and not unit.aggregate:
+            assert vector[unit.file_system_info.path] == \
+                   (unit.position.x, unit.position.y, \
+                    unit.size.x, unit.size.y)
+        stack.extend([child for child in (unit.left, unit.right) if child])
+
+
+def test_export_round_trip():
+    '''() -> NoneType
+
+    The records written in the binary format are read back the same
+    '''
+
+    random.seed(3)
+    root = benchmark.make_tree(3, 2, 5, "uniform")[0]
+    rows = list(export.records(root, stdlib.Point(0, 0), \
+                               stdlib.Point(1004, 510)))
+    # sizes and sides too big for 32 bits
+    rows.append(("big/\xff", 2 ** 40, "file", 70000, 0, 0, 70000, 1))
+    output = StringIO.StringIO()
+    assert export.write_binary(rows, output) == len(rows)
+    output.seek(0)
+    assert list(export.read_binary(output)) == rows
+
+
+if __name__ == "__main__":
+    for name, function in sorted(globals().items()):
+        if name.startswith("test_"):
+            function()
+            print name, "ok"
@@ -20,7 +20,7 @@ if __name__ == "__main__":
     # show opening dialog
     path = get_start_up_open_folder()
     # if there is a chosen folder
-    while path:
-        # start the GUI
+    if path:
+        # start the GUI, the other folders are loaded in the same window
         main = main_form.MainForm(path)
-        path = main.show_dialog()
+        main.show_dialog()
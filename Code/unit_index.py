@@ -0,0 +1,113 @@
+import stdlib
+
+
+class UnitIndex(object):
+
+    def __init__(self, position, size, cell = None):
+        '''(UnitIndex, stdlib.Point, stdlib.Point[, int]) -> NoneType
+
+        Construct an empty index of the files shown on a map, to find the
+        one under the mouse without going through all the display units
+        The map is cut in square cells, every cell knows the files over it
+
+        self : the index
+        position : the position of the map on the screen
+        size : the size of the map
+        cell : the size of a cell in pixels, stdlib.INDEX_CELL if None
+        '''
+
+        if cell is None:
+            cell = stdlib.INDEX_CELL
+        self.position = stdlib.Point(position.x, position.y)
+        self.size = stdlib.Point(size.x, size.y)
+        self.cell = cell
+        # (column, row) -> list of display units
+        self.cells = {}
+
+    def _cells(self, rect):
+        '''(UnitIndex, tuple) -> list
+
+        Return the (column, row) of every cell under the rectangle
+
+        self : the index
+        rect : (x, y, width, height) on the screen
+        '''
+
+        x, y, width, height = rect
+        x -= self.position.x
+        y -= self.position.y
+        cell = self.cell
+        return [(column, row) \
+                for column in range(x // cell, (x + width - 1) // cell + 1) \
+                for row in range(y // cell, (y + height - 1) // cell + 1)]
+
+    def replace(self, unit):
+        '''(UnitIndex, display_unit.DisplayUnit) -> NoneType
+
+        Forget the files which were inside the unit and add the ones it
+        shows now, after it was laid out again
+
+        self : the index
+        unit : the display unit
+        '''
+
+        x, y, width, height = rect = unit.screen_rect()
+        for key in self._cells(rect):
+            units = self.cells.get(key)
+            if not units:
+                continue
+            kept = []
+            for other in units:
+                other_x, other_y, other_width, other_height = \
+                         other.screen_rect()
+                if other_x < x or other_y < y or \
+                   other_x + other_width > x + width or \
+                   other_y + other_height > y + height:
+                    kept.append(other)
+            self.cells[key] = kept
+        stack = [unit]
+        while stack:
+            unit = stack.pop()
+            if unit.typ == stdlib.FILE:
+                self._add(unit)
+            else:
+                if unit.left:
+                    stack.append(unit.left)
+                if unit.right:
+                    stack.append(unit.right)
+
+    def _add(self, unit):
+        '''(UnitIndex, display_unit.DisplayUnit) -> NoneType
+
+        Put the file in every cell it is over
+        A file too thin to be seen is left out, it can not be hovered
+
+        self : the index
+        unit : the display unit of the file
+        '''
+
+        if unit.size.x <= 0 or unit.size.y <= 0:
+            return
+        for key in self._cells(unit.screen_rect()):
+            self.cells.setdefault(key, []).append(unit)
+
+    def find(self, x, y):
+        '''(UnitIndex, int, int) -> display_unit.DisplayUnit
+
+        Return the display unit of the file under the point, None if there
+        is none
+        A point on the line between 2 files belongs to the right or lower
+        one
+
+        self : the index
+        x : x of the point
+        y : y of the point
+        '''
+
+        key = ((x - self.position.x) // self.cell, \
+               (y - self.position.y) // self.cell)
+        for unit in self.cells.get(key, ()):
+            unit_x, unit_y, width, height = unit.screen_rect()
+            if unit_x <= x < unit_x + width and unit_y <= y < unit_y + height:
+                return unit
+        return None
@@ -0,0 +1,180 @@
+import stdlib
+# numpy is optional, only this module needs it, see README.md
+import numpy
+
+# one rectangle for every file or directory on the map, in pixels
+RECT = numpy.dtype([("x", numpy.int32), ("y", numpy.int32), \
+                    ("w", numpy.int32), ("h", numpy.int32), \
+                    ("depth", numpy.int16), ("node_id", numpy.int32)])
+
+
+def layout(tree, position, size):
+    '''(compact_tree.CompactTree, stdlib.Point, stdlib.Point)
+                                                          -> numpy.ndarray
+    Return the rectangles of every file and directory of the tree, as an
+    array of RECT, the top directory first
+    The rectangles are the same as the ones of display_unit.DisplayUnit:
+    a list of files is cut where the sum of the sizes passes half of the
+    total, along the longer side, until there is only one file
+    Every cut of the same round is done at once for the whole map
+
+    tree : the tree
+    position : the position of the map
+    size : the size of the map
+    '''
+
+    order = numpy.frombuffer(tree.order, dtype = numpy.int32)
+    first = numpy.frombuffer(tree.first, dtype = numpy.int32)
+    count = numpy.frombuffer(tree.count, dtype = numpy.int32)
+    sizes = numpy.frombuffer(tree.size, dtype = numpy.float64)
+    typ = tree_typ(tree)
+    # prefix[k] is the total size of the slots before k
+    prefix = numpy.zeros(len(order) + 1)
+    numpy.cumsum(sizes[order], out = prefix[1:])
+    # the top directory
+    parts = [numpy.array([(position.x, position.y, size.x, size.y, 0, 0)], \
+                         dtype = RECT)]
+    # every piece of the map still to cut: a range of slots, its
+    # rectangle and the depth of its directory
+    start = first[:1].astype(numpy.int64)
+    end = start + count[:1]
+    x = numpy.array([position.x], dtype = numpy.int64)
+    y = numpy.array([position.y], dtype = numpy.int64)
+    w = numpy.array([size.x], dtype = numpy.int64)
+    h = numpy.array([size.y], dtype = numpy.int64)
+    depth = numpy.zeros(1, dtype = numpy.int64)
+    while len(start):
+        total = prefix[end] - prefix[start]
+        # a file is always shown, even of size 0, but a list of files of
+        # size 0 is not cut, like in display_unit
+        keep = (end - start == 1) | ((end > start) & (total > 0))
+        start, end, x, y, w, h, depth, total = \
+               [item[keep] for item in (start, end, x, y, w, h, depth, total)]
+        single = end - start == 1
+        # pieces of one file: put it on the map, open the directories
+        node = order[start[single]]
+        parts.append(_rects(x[single], y[single], w[single], h[single], \
+                            depth[single] + 1, node))
+        is_open = (count[node] > 0) & (typ[node] == stdlib.DIRECTORY) & \
+                  (sizes[node] > 0)
+        opened = node[is_open]
+        open_start = first[opened].astype(numpy.int64)
+        open_end = open_start + count[opened]
+        open_rect = [item[single][is_open] for item in (x, y, w, h)]
+        open_depth = depth[single][is_open] + 1
+        # pieces of many files: cut them in 2
+        many = ~single
+        start, end, x, y, w, h, depth, total = \
+               [item[many] for item in (start, end, x, y, w, h, depth, total)]
+        base = prefix[start]
+        pivot = numpy.searchsorted(prefix, base + numpy.floor(total / 2), \
+                                   side = "right") - 1
+        percent = (prefix[pivot] - base) / total
+        # a first file bigger than half takes the whole piece
+        whole = pivot == start
+        percent[whole] = 1
+        pivot[whole] = end[whole]
+        direction = w > h
+        first_w = numpy.where(direction, (w * percent).astype(numpy.int64), w)
+        first_h = numpy.where(direction, h, (h * percent).astype(numpy.int64))
+        second_x = x + numpy.where(direction, first_w, 0)
+        second_y = y + numpy.where(direction, 0, first_h)
+        second_w = w - numpy.where(direction, first_w, 0)
+        second_h = h - numpy.where(direction, 0, first_h)
+        start, end, x, y, w, h, depth = \
+               [numpy.concatenate(items) for items in \
+                ((start, pivot, open_start), \
+                 (pivot, end, open_end), \
+                 (x, second_x, open_rect[0]), \
+                 (y, second_y, open_rect[1]), \
+                 (first_w, second_w, open_rect[2]), \
+                 (first_h, second_h, open_rect[3]), \
+                 (depth, depth, open_depth))]
+    return numpy.concatenate(parts)
+
+
+def tree_typ(tree):
+    '''(compact_tree.CompactTree) -> numpy.ndarray
+
+    Return the types of the files of the tree as an array
+
+    tree : the tree
+    '''
+
+    return numpy.frombuffer(tree.typ, dtype = numpy.int8)
+
+
+def _rects(x, y, w, h, depth, node):
+    '''(numpy.ndarray, ...) -> numpy.ndarray
+
+    Return an array of RECT made from its columns
+
+    x, y, w, h : the rectangles
+    depth : the depth of the directories
+    node : the number of the files
+    '''
+
+    rects = numpy.empty(len(node), dtype = RECT)
+    rects["x"] = x
+    rects["y"] = y
+    rects["w"] = w
+    rects["h"] = h
+    rects["depth"] = depth
+    rects["node_id"] = node
+    return rects
+
+
+def hit_test(rects, x, y):
+    '''(numpy.ndarray, int, int) -> int
+
+    Return the number of the deepest file whose rectangle has the point,
+    -1 if there is none
+    The borders are inside, like stdlib.Point.inside
+
+    rects : the rectangles made by layout
+    x : x of the point
+    y : y of the point
+    '''
+
+    inside = (rects["x"] <= x) & (x <= rects["x"] + rects["w"]) & \
+             (rects["y"] <= y) & (y <= rects["y"] + rects["h"])
+    found = numpy.flatnonzero(inside)
+    if not len(found):
+        return -1
+    # argmax on the reversed list takes the last of the deepest
+    deepest = found[len(found) - 1 - \
+                    numpy.argmax(rects["depth"][found][::-1])]
+    return int(rects["node_id"][deepest])
+
+
+def draw(surface, tree, rects, colors = None):
+    '''(pygame.Surface, compact_tree.CompactTree, numpy.ndarray[, numpy.ndarray])
+                                                                -> NoneType
+    Draw every file of the map on the surface, a directory whose children
+    are not read is drawn as a file
+
+    surface : where to draw
+    tree : the tree
+    rects : the rectangles made by layout
+    colors : the color of every file, a random one if None
+    '''
+
+    if colors is None:
+        colors = random_colors(len(tree))
+    count = numpy.frombuffer(tree.count, dtype = numpy.int32)
+    files = rects[count[rects["node_id"]] == 0]
+    for x, y, w, h, node in zip(files["x"].tolist(), files["y"].tolist(), \
+                                files["w"].tolist(), files["h"].tolist(), \
+                                files["node_id"].tolist()):
+        surface.fill(tuple(colors[node]), (x, y, w, h))
+
+
+def random_colors(count):
+    '''(int) -> numpy.ndarray
+
+    Return count random colors, like the ones of display_unit.DisplayUnit
+
+    count : the number of colors
+    '''
+
+    return numpy.random.randint(50, 256, (count, 3))
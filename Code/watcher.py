@@ -0,0 +1,530 @@
+import stdlib
+import systemIO
+import ctypes
+import ctypes.util
+import errno
+import os
+import os.path
+import struct
+import time
+
+# inotify flags, from <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_NONBLOCK = 0x00000800
+IN_CLOEXEC = 0x00080000
+WATCH_MASK = IN_MODIFY | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+# every event is: watch descriptor, mask, cookie, length of the name,
+# followed by the name padded with zeros
+EVENT = struct.Struct("iIII")
+
+
+def _load_libc():
+    '''() -> ctypes.CDLL
+
+    Return the C library if it has inotify, None otherwise
+    '''
+
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno = True)
+        # only linux has these
+        libc.inotify_init1
+        libc.inotify_add_watch
+        libc.inotify_rm_watch
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+_libc = _load_libc()
+
+
+def available():
+    '''() -> boolean
+
+    Return True if the system can tell about changes of the files
+    '''
+
+    return _libc is not None
+
+
+class Watcher(object):
+
+    def __init__(self, root, scanner):
+        '''(Watcher, systemIO.DirectoryInfo, scanner.Scanner) -> NoneType
+
+        Construct a watcher following the changes of every directory of the
+        tree
+        Raise OSError if the system can not watch files
+
+        self : the watcher
+        root : the top of the tree
+        scanner : the scanner reading new directories
+        '''
+
+        if not available():
+            raise OSError(errno.ENOSYS, "inotify is not available")
+        self.fd = _libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+        self.root = root
+        self.scanner = scanner
+        # watch descriptor -> directory
+        self.directories = {}
+        # id of the directory -> watch descriptor
+        self.watches = {}
+        # True if the system can not watch any more directories
+        self.full = False
+        # id of the directory -> directory left unwatched because the system
+        # had no watches left, they are read again every
+        # stdlib.WATCH_REFRESH_INTERVAL instead
+        self.unwatched = {}
+        self.last_refresh = time.time()
+        # id of the directory -> directory to read again once the events
+        # waiting are applied, see _read_later
+        self.stale = {}
+        # id of the directory -> [its list of children, its length, path
+        # -> child], so a child is found without going through all of
+        # them, see _find
+        self.children = {}
+        self._watch_tree(root)
+
+    def close(self):
+        '''(Watcher) -> NoneType
+
+        Stop watching, all the watches are removed with the descriptor
+
+        self : the watcher
+        '''
+
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+        self.directories = {}
+        self.watches = {}
+        self.unwatched = {}
+        self.stale = {}
+        self.children = {}
+
+    def _watch(self, directory):
+        '''(Watcher, systemIO.DirectoryInfo) -> NoneType
+
+        Start watching the directory
+        If the system has no watches left, the directory is kept in
+        self.unwatched and self.full is set
+
+        self : the watcher
+        directory : the directory
+        '''
+
+        if id(directory) in self.watches or not directory.loaded:
+            # the children of an unread directory are not in the tree
+            return
+        path = directory.path
+        if isinstance(path, unicode):
+            path = path.encode("utf-8")
+        wd = _libc.inotify_add_watch(self.fd, path, WATCH_MASK)
+        if wd < 0:
+            # out of watches, or the directory can not be read
+            if ctypes.get_errno() == errno.ENOSPC:
+                self.full = True
+                self.unwatched[id(directory)] = directory
+            return
+        self.unwatched.pop(id(directory), None)
+        self.directories[wd] = directory
+        self.watches[id(directory)] = wd
+
+    def _watch_tree(self, top):
+        '''(Watcher, systemIO.FileSystemInfo) -> NoneType
+
+        Start watching every directory under top, top included
+
+        self : the watcher
+        top : the top of the sub-tree
+        '''
+
+        stack = [top]
+        while stack:
+            file_info = stack.pop()
+            if file_info.typ == stdlib.DIRECTORY:
+                self._watch(file_info)
+                stack.extend(file_info.children)
+
+    def _unwatch_tree(self, top):
+        '''(Watcher, systemIO.FileSystemInfo) -> NoneType
+
+        Stop watching every directory under top, top included, it is no
+        longer in the tree, so its hard links are counted at another link
+        if there is one
+
+        self : the watcher
+        top : the top of the sub-tree
+        '''
+
+        record = systemIO.links_of(self.root, False)
+        stack = [top]
+        while stack:
+            file_info = stack.pop()
+            if file_info.typ == stdlib.FILE:
+                if record:
+                    record.remove(file_info.path)
+            elif file_info.typ == stdlib.DIRECTORY:
+                self.unwatched.pop(id(file_info), None)
+                self.stale.pop(id(file_info), None)
+                self.children.pop(id(file_info), None)
+                wd = self.watches.pop(id(file_info), None)
+                if wd is not None:
+                    del self.directories[wd]
+                    _libc.inotify_rm_watch(self.fd, wd)
+                stack.extend(file_info.children)
+
+    def rewatch(self):
+        '''(Watcher) -> NoneType
+
+        Match the watches with the tree after it was changed by someone else
+        (a refresh): watch the new directories and forget the removed ones
+
+        self : the watcher
+        '''
+
+        old = self.watches
+        self.watches = {}
+        self.directories = {}
+        self.unwatched = {}
+        self.children = {}
+        stack = [self.root]
+        while stack:
+            file_info = stack.pop()
+            if file_info.typ == stdlib.DIRECTORY:
+                wd = old.pop(id(file_info), None)
+                if wd is None:
+                    self._watch(file_info)
+                else:
+                    self.directories[wd] = file_info
+                    self.watches[id(file_info)] = wd
+                stack.extend(file_info.children)
+        for wd in old.values():
+            _libc.inotify_rm_watch(self.fd, wd)
+
+    def _read_events(self):
+        '''(Watcher) -> list
+
+        Return the list of (watch descriptor, mask, cookie, name) of all the
+        events waiting, without blocking
+
+        self : the watcher
+        '''
+
+        events = []
+        while True:
+            try:
+                data = os.read(self.fd, 65536)
+            except OSError, e:
+                if e.errno in (errno.EAGAIN, errno.EINTR):
+                    return events
+                raise
+            offset = 0
+            while offset < len(data):
+                wd, mask, cookie, length = EVENT.unpack_from(data, offset)
+                offset += EVENT.size
+                name = data[offset:offset + length].rstrip("\0")
+                offset += length
+                events.append((wd, mask, cookie, name))
+
+    def poll(self):
+        '''(Watcher) -> list
+
+        Apply all the changes waiting to the tree
+        The directories where a change could not be read, and the ones not
+        watched, are read again afterwards, see _read_again
+        Return the list of directories which have changed
+
+        self : the watcher
+        '''
+
+        events = self._read_events()
+        # id of the directory -> directory
+        changed = {}
+        # files moved out of a directory, they may come back in another one
+        moved = {}
+        for wd, mask, cookie, name in events:
+            if mask & IN_Q_OVERFLOW:
+                # some events are lost, look at the modified times instead
+                for directory in self.scanner.refresh(self.root):
+                    changed[id(directory)] = directory
+                self.rewatch()
+                continue
+            if mask & IN_IGNORED:
+                # the directory is gone
+                directory = self.directories.pop(wd, None)
+                if directory:
+                    self.watches.pop(id(directory), None)
+                continue
+            directory = self.directories.get(wd)
+            if not directory:
+                continue
+            path = os.path.join(directory.path, name)
+            if mask & (IN_DELETE | IN_MOVED_FROM):
+                file_info = self._remove(directory, path)
+                if file_info and mask & IN_MOVED_FROM:
+                    moved[cookie] = file_info
+                elif file_info:
+                    self._unwatch_tree(file_info)
+            elif mask & (IN_CREATE | IN_MOVED_TO):
+                file_info = moved.pop(cookie, None)
+                if file_info and mask & IN_MOVED_TO:
+                    self._move(file_info, directory, path)
+                else:
+                    self._add(directory, path)
+            elif mask & IN_MODIFY:
+                self._resize(directory, path)
+            changed[id(directory)] = directory
+        # moved out of the tree
+        for file_info in moved.values():
+            self._unwatch_tree(file_info)
+        for directory in self._read_again():
+            changed[id(directory)] = directory
+        record = systemIO.links_of(self.root, False)
+        if record:
+            # links which took or lost the size of their file
+            for directory in record.take_changed():
+                changed[id(directory)] = directory
+        changed = changed.values()
+        systemIO.update_parents(changed)
+        return changed
+
+    def _read_later(self, directory, again = True):
+        '''(Watcher, systemIO.DirectoryInfo[, boolean]) -> NoneType
+
+        Read the directory again once the events waiting are applied, when
+        the paths of the tree are up to date: a file created in a directory
+        which is then renamed can not be read at its old path
+
+        self : the watcher
+        directory : the directory
+        again : True to read its children again even if its modified time
+                has not changed, False to read only the sub-directories
+                whose modified time has
+        '''
+
+        if again:
+            directory.mtime = None
+        self.stale[id(directory)] = directory
+
+    def _read_again(self):
+        '''(Watcher) -> list
+
+        Read the directories waiting in self.stale, and every
+        stdlib.WATCH_REFRESH_INTERVAL the directories which are not watched,
+        like Scanner.refresh, and watch the new sub-directories
+        Return the list of directories which have changed
+
+        self : the watcher
+        '''
+
+        tops = [directory for directory in self.stale.values() \
+                if id(directory) in self.watches]
+        self.stale = {}
+        now = time.time()
+        if self.unwatched and \
+           now - self.last_refresh >= stdlib.WATCH_REFRESH_INTERVAL / 1000.0:
+            self.last_refresh = now
+            # the highest ones, refresh goes down to the others
+            tops.extend([directory for directory in self.unwatched.values() \
+                         if directory is self.root or \
+                         (directory.parent is not None and \
+                          id(directory.parent) not in self.unwatched)])
+        changed = []
+        for directory in tops:
+            changed.extend(self.scanner.refresh(directory))
+        for directory in changed:
+            self._watch_tree(directory)
+        return changed
+
+    def _find(self, directory, path):
+        '''(Watcher, systemIO.DirectoryInfo, string)
+                                              -> systemIO.FileSystemInfo
+        Return the child of the directory at path, None if there is none
+        The children are looked up by path in self.children, which is made
+        again when the scanner has changed the children: a refresh gives the
+        directory a new list, a scan adds to it
+
+        self : the watcher
+        directory : the directory
+        path : the path of the child
+        '''
+
+        children = self.children.get(id(directory))
+        if children is None or children[0] is not directory.children or \
+           children[1] != len(directory.children):
+            by_path = {}
+            for child in directory.children:
+                by_path[child.path] = child
+            children = [directory.children, len(directory.children), \
+                        by_path]
+            self.children[id(directory)] = children
+        return children[2].get(path)
+
+    def _append(self, directory, file_info):
+        '''(Watcher, systemIO.DirectoryInfo, systemIO.FileSystemInfo)
+                                                                -> NoneType
+        Add the file or directory to the children of the directory
+
+        self : the watcher
+        directory : the directory
+        file_info : the new child
+        '''
+
+        self._find(directory, file_info.path)
+        children = self.children[id(directory)]
+        directory.children.append(file_info)
+        children[1] += 1
+        children[2][file_info.path] = file_info
+
+    def _remove(self, directory, path):
+        '''(Watcher, systemIO.DirectoryInfo, string)
+                                              -> systemIO.FileSystemInfo
+        Remove the child at path from the directory and return it, or None
+        if there is no such child
+        The child loses its parent until it is put back by _move
+
+        self : the watcher
+        directory : the directory
+        path : the path of the child
+        '''
+
+        file_info = self._find(directory, path)
+        if file_info is None:
+            return None
+        children = self.children[id(directory)]
+        # the files compare by size, so look for the object itself
+        i = map(id, directory.children).index(id(file_info))
+        directory.children.pop(i)
+        children[1] -= 1
+        del children[2][path]
+        file_info.parent = None
+        return file_info
+
+    def _add(self, directory, path):
+        '''(Watcher, systemIO.DirectoryInfo, string) -> NoneType
+
+        Read the new file or directory at path and add it to the directory
+        A new directory is watched before it is read, and checked again
+        after its sub-directories are watched, so nothing created meanwhile
+        is missed
+        If it can not be read, the directory is read again later
+
+        self : the watcher
+        directory : the directory
+        path : the path of the new child
+        '''
+
+        # created twice, or created and then moved in
+        old = self._remove(directory, path)
+        if old:
+            self._unwatch_tree(old)
+        if systemIO.excluded(os.path.basename(path)):
+            return
+        try:
+            is_directory, size, link = systemIO.read_entry( \
+                path, os.stat(directory.path).st_dev)
+            if is_directory:
+                file_info = systemIO.DirectoryInfo(path, directory, False)
+                self._watch(file_info)
+                self.scanner.fill([file_info])
+            else:
+                file_info = systemIO.FileSystemInfo(path, directory, \
+                                                    stdlib.FILE, size)
+        except OSError:
+            # gone, or the directory was renamed and path is out of date
+            self._read_later(directory)
+            return
+        self._append(directory, file_info)
+        if file_info.typ == stdlib.DIRECTORY:
+            self._watch_tree(file_info)
+            self._read_later(file_info, False)
+        elif link is not None:
+            systemIO.links_of(directory).add(file_info, link, size)
+
+    def _move(self, file_info, directory, path):
+        '''(Watcher, systemIO.FileSystemInfo, systemIO.DirectoryInfo, string)
+                                                                -> NoneType
+        Put a file or directory moved inside the tree in its new place
+        The watches follow the directories, so they are kept, the hard links
+        are recorded again at their new paths
+
+        self : the watcher
+        file_info : the moved file or directory
+        directory : the new parent
+        path : the new path
+        '''
+
+        old = self._remove(directory, path)
+        if old:
+            self._unwatch_tree(old)
+        old_path = file_info.path
+        file_info.parent = directory
+        record = systemIO.links_of(self.root, False)
+        # (file, device and inode, size) of the hard links moved
+        links = []
+        # change the path of everything inside
+        stack = [file_info]
+        while stack:
+            item = stack.pop()
+            key = record and record.key_of(item.path)
+            if item.typ == stdlib.FILE and key is not None:
+                links.append((item, key, record.sizes[key]))
+                record.remove(item.path)
+            item.path = path + item.path[len(old_path):]
+            if item.typ == stdlib.DIRECTORY:
+                # its children are found by their old paths
+                self.children.pop(id(item), None)
+                stack.extend(item.children)
+        self._append(directory, file_info)
+        for item, key, size in links:
+            record.add(item, key, size)
+
+    def _resize(self, directory, path):
+        '''(Watcher, systemIO.DirectoryInfo, string) -> NoneType
+
+        Read again the size of the file at path, following a link only if
+        the scanner does
+        If the file is not there or can not be read, the directory is read
+        again later
+
+        self : the watcher
+        directory : the directory
+        path : the path of the file
+        '''
+
+        if systemIO.excluded(os.path.basename(path)):
+            return
+        file_info = self._find(directory, path)
+        if file_info is None:
+            # never added, or the directory was renamed
+            self._read_later(directory)
+        elif file_info.typ == stdlib.FILE:
+            try:
+                # links and mount points are read as the scanner does
+                is_directory, size, link = systemIO.read_entry( \
+                    path, os.stat(directory.path).st_dev)
+            except OSError:
+                # deleted, or the directory was renamed
+                self._read_later(directory)
+                return
+            if is_directory:
+                # replaced by a directory
+                self._read_later(directory)
+                return
+            record = systemIO.links_of(directory, link is not None)
+            if link is not None:
+                record.add(file_info, link, size)
+            else:
+                if record:
+                    record.remove(path)
+                file_info.size = size
@@ -1,5 +1,7 @@
 import stdlib
 import label
+import control
+import instrument
 import pygame
 
 
@@ -20,6 +22,18 @@ class WinForm:
         self.position = stdlib.Point(0, 0)
         self.running = True
         self.screen = None
+        # a copy of the screen without hover and selection, see keep
+        self.cache = None
+        # the parts of the screen drawn since the last update
+        self.dirty = []
+        # what the last loop did: the number of events waiting, the number
+        # of mouse moves left out and the time taken, in milliseconds
+        self.backlog = 0
+        self.coalesced = 0
+        self.frame_time = 0
+        self.last_report = 0
+        # where the numbers of instrument.py are shown, None if they are not
+        self.statistics_rect = None
         self.size = stdlib.Point(size.x, size.y)
 
     def add_control(self, control):
@@ -46,19 +60,84 @@ class WinForm:
         for i in range(0, len(self.controls)):
             self.controls[i].draw()
 
-    def _handle_event(self):
-        '''(WinForm) -> Boolean
+    def invalidate(self, rect):
+        '''(WinForm, tuple) -> NoneType
+
+        Remember that a part of the screen was drawn, it is shown at the end
+        of the loop
+
+        self : the form
+        rect : (x, y, width, height) of the part
+        '''
+
+        self.dirty.append(rect)
+
+    def keep(self, rect = None):
+        '''(WinForm[, tuple]) -> NoneType
+
+        Copy a part of the screen into the cache, so it can be put back by
+        restore after something was drawn over it
+
+        self : the form
+        rect : (x, y, width, height) of the part, the whole screen if None
+        '''
+
+        if rect is None:
+            rect = (0, 0, self.size.x, self.size.y)
+        self.cache.blit(self.screen, rect[:2], rect)
+
+    def restore(self, rect):
+        '''(WinForm, tuple) -> NoneType
+
+        Put back a part of the screen as it was kept in the cache
+
+        self : the form
+        rect : (x, y, width, height) of the part
+        '''
+
+        self.screen.blit(self.cache, rect[:2], rect)
+        self.invalidate(rect)
+
+    def _get_events(self, wait):
+        '''(WinForm, boolean) -> list
+
+        Return all the events waiting, only the last mouse move is kept
+        since the ones before it are already out of date
+
+        self : the form
+        wait : True to sleep until there is an event
+        '''
+
+        events = pygame.event.get()
+        if wait and not events:
+            events = [pygame.event.wait()] + pygame.event.get()
+        self.backlog = len(events)
+        last_motion = None
+        for event in events:
+            if event.type == pygame.MOUSEMOTION:
+                last_motion = event
+        events = [event for event in events \
+                  if event.type != pygame.MOUSEMOTION or event is last_motion]
+        self.coalesced = self.backlog - len(events)
+        return events
+
+    @instrument.timed("events")
+    def _handle_event(self, event):
+        '''(WinForm, pygame.Event) -> NoneType
 
         Handle all kind of event happened
 
         self : the form
+        event : the event
         '''
 
-        # get the event
-        event = pygame.event.poll()
         if event.type == pygame.QUIT:
                 self.running = False
                 return
+        if event.type not in stdlib.MOUSE_EVENT and \
+           event.type != pygame.KEYUP:
+            # the idle timer, or an event nobody wants
+            return
         # find the right control which the event apply to
         for i in range(0, len(self.controls)):
             # if a mouse event
@@ -73,7 +152,6 @@ class WinForm:
                 print event.key
             # execute the function and its argument
             command[0](command[1])
-        return
 
     def show_dialog(self):
         '''(WinForm) -> NoneType
@@ -85,14 +163,84 @@ class WinForm:
 
         pygame.init()
         self.screen = pygame.display.set_mode((self.size.x, self.size.y))
+        self.cache = pygame.Surface((self.size.x, self.size.y))
         self.screen.fill(self.current_color)
         self._draw()
+        self.keep()
+        pygame.display.flip()
+        self.dirty = []
+        clock = pygame.time.Clock()
+        # wake up the form now and then to do its own work
+        pygame.time.set_timer(stdlib.IDLE_EVENT, stdlib.IDLE_INTERVAL)
+        busy = False
         while self.running:
-            # get and handle event
-            self._handle_event()
-            # redraw if anything has changed
-            pygame.display.flip()
+            # get and handle the events, sleep if there is nothing to do
+            events = self._get_events(not busy)
+            start = pygame.time.get_ticks()
+            if self.statistics_rect:
+                # take the numbers away while the screen is drawn and kept
+                self.restore(self.statistics_rect)
+                self.statistics_rect = None
+            for event in events:
+                self._handle_event(event)
+            # let the form do its own work
+            busy = self.idle()
+            if instrument.enabled:
+                instrument.count("rects", len(self.dirty))
+                instrument.end_frame()
+                if stdlib.INSTRUMENT_OVERLAY:
+                    self._draw_statistics()
+            # show only what has changed
+            if self.dirty:
+                pygame.display.update(self.dirty)
+                self.dirty = []
+            self.frame_time = pygame.time.get_ticks() - start
+            self._report()
+            # do not draw more frames than the screen can show
+            clock.tick(stdlib.FRAME_RATE)
+        pygame.time.set_timer(stdlib.IDLE_EVENT, 0)
         pygame.quit()
+        if instrument.enabled:
+            instrument.dump()
+
+    def _draw_statistics(self):
+        '''(WinForm) -> NoneType
+
+        Show the counters and times of instrument.py over the top left
+        corner of the form
+
+        self : the form
+        '''
+
+        font = control.get_font(stdlib.FONT_NAME, 16)
+        texts = [font.render(line, True, stdlib.BLACK) \
+                 for line in instrument.statistics.lines()]
+        if not texts:
+            return
+        width = max(text.get_width() for text in texts) + 4
+        height = sum(text.get_height() for text in texts) + 4
+        self.statistics_rect = (0, 0, width, height)
+        pygame.draw.rect(self.screen, (255, 255, 255), self.statistics_rect)
+        y = 2
+        for text in texts:
+            self.screen.blit(text, (2, y))
+            y += text.get_height()
+        self.invalidate(self.statistics_rect)
+
+    def _report(self):
+        '''(WinForm) -> NoneType
+
+        Print how busy the loop is, every FRAME_REPORT milliseconds
+
+        self : the form
+        '''
+
+        now = pygame.time.get_ticks()
+        if stdlib.FRAME_REPORT and \
+           now - self.last_report >= stdlib.FRAME_REPORT:
+            self.last_report = now
+            print "frame %4d ms, %3d events waiting, %3d moves left out" % \
+                  (self.frame_time, self.backlog, self.coalesced)
 
     def set_up_GUI(self):
         '''(WinForm) -> NoneType
@@ -103,6 +251,18 @@ class WinForm:
         '''
         pass
 
+    def idle(self):
+        '''(WinForm) -> boolean
+
+        Do the work of the form which is not caused by an event, called
+        once every loop, and at least every IDLE_INTERVAL
+        Return True if there is more work to do, so the loop does not wait
+        for an event
+
+        self : the form
+        '''
+        return False
+
     def close(self):
         '''(WinForm) -> NoneType
 